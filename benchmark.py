@@ -0,0 +1,204 @@
+"""
+Benchmark suite for the data_prep aggregations and the w209 endpoints.
+
+Runs against a seeded synthetic dataset (see synthetic_data.py), so it works
+without the LFS-tracked CSV. For every function and route it records wall
+time (min/median over --repeat runs, caches cleared before each run) and
+peak traced memory (one extra run under tracemalloc), and writes the
+results as JSON. Pass --compare with an earlier results file to flag
+regressions between commits.
+
+    python benchmark.py --states 50 --readings 2 --out bench.json
+    python benchmark.py --out new.json --compare bench.json --threshold 1.25
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import data_prep
+from synthetic_data import write_synthetic_dataset
+
+
+def measure(fn, repeat, before=None):
+    """Run fn `repeat` times for wall time and once more under tracemalloc for peak memory."""
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    if before:
+        before()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms_min": round(min(timings) * 1000, 3),
+        "wall_ms_median": round(statistics.median(timings) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def function_cases(dataset_path, dataset, state):
+    df, cube = dataset.df, dataset.cube
+    monthly = data_prep.get_cube_monthly_averages(cube)
+    positions = data_prep.select_rows(df)
+    return {
+        "load_filtered_data": lambda: data_prep.load_filtered_data(dataset_path),
+        "fold_batches[cube,32MB]": lambda: data_prep.fold_batches(
+            data_prep.iter_batches(dataset_path, memory_budget=32 * 1024 * 1024),
+            data_prep.build_aggregate_cube, data_prep.merge_cubes),
+        "build_aggregate_cube": lambda: data_prep.build_aggregate_cube(df),
+        "rollup_cube[state]": lambda: data_prep.rollup_cube(cube, ["state"]),
+        "get_monthly_averages": lambda: data_prep.get_monthly_averages(df),
+        "get_cube_monthly_averages": lambda: data_prep.get_cube_monthly_averages(cube),
+        "get_state_monthly_averages": lambda: data_prep.get_state_monthly_averages(df, use_rolling=True),
+        "get_monthly_avg_by_region": lambda: data_prep.get_monthly_avg_by_region(df),
+        "get_seasonal_avg_by_region": lambda: data_prep.get_seasonal_avg_by_region(cube),
+        "get_yearly_trends": lambda: data_prep.get_yearly_trends(df),
+        "get_state_averages_with_trend": lambda: data_prep.get_state_averages_with_trend(cube),
+        "get_all_state_monthly_averages": lambda: data_prep.get_all_state_monthly_averages(cube),
+        "get_state_trends": lambda: data_prep.get_state_trends(data_prep.get_all_state_monthly_averages(cube)),
+        "get_wind_rose_data": lambda: data_prep.get_wind_rose_data(df, state),
+        "get_animated_wind_rose_data[wind]": lambda: data_prep.get_animated_wind_rose_data(df, "wind"),
+        "get_animated_wind_rose_data[co]": lambda: data_prep.get_animated_wind_rose_data(df, "co"),
+        "get_animated_co_data": lambda: data_prep.get_animated_co_data(cube),
+        "get_wind_vectors_static": lambda: data_prep.get_wind_vectors_static(cube),
+        "get_wind_vectors_by_year": lambda: data_prep.get_wind_vectors_by_year(cube),
+        "get_wind_vectors_by_season": lambda: data_prep.get_wind_vectors_by_season(cube),
+        "get_wind_vectors[month]": lambda: data_prep.get_wind_vectors(cube, "month"),
+        "calculate_correlation[region]": lambda: data_prep.calculate_correlation(df, ["region"]),
+        "calculate_trend_line": lambda: data_prep.calculate_trend_line(monthly, "date", "rolling_avg_co"),
+        "cube_correlation[region]": lambda: data_prep.cube_correlation(cube, ["region"]),
+        "compute_raw_state_correlations": lambda: data_prep.compute_raw_state_correlations(cube),
+        "clean_for_json[monthly]": lambda: data_prep.clean_for_json(monthly),
+        "iter_json_records[all]": lambda: sum(map(len, data_prep.iter_json_records(df, positions))),
+        "select_rows[state,year]": lambda: data_prep.select_rows(df, state, "2020-01-01", "2020-12-31"),
+        "select_rows[state,year,index]": lambda: data_prep.select_rows(
+            df, state, "2020-01-01", "2020-12-31", index=dataset.index),
+        "downsample_rows[32 buckets]": lambda: data_prep.downsample_rows(df, positions, 32),
+        "distribution_counts": lambda: data_prep.distribution_counts(df),
+        "query_cube[state,season]": lambda: data_prep.query_cube(
+            cube, states=[state], seasons=["Winter"], group_by=["year"]),
+    }
+
+
+def endpoint_cases(app, state):
+    """Every GET route without URL arguments, plus the POST routes with a state body."""
+    client = app.test_client()
+    cases = {}
+    for rule in app.url_map.iter_rules():
+        if rule.arguments or rule.endpoint == "static" or rule.rule == "/":
+            continue
+        if "GET" in rule.methods:
+            cases[f"GET {rule.rule}"] = lambda url=rule.rule: client.get(url).get_data()
+        elif "POST" in rule.methods:
+            cases[f"POST {rule.rule}"] = lambda url=rule.rule: client.post(url, json={"state": state}).get_data()
+    return cases
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print median wall-time ratios against a baseline; return the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':45} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for name, new in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or not old["wall_ms_median"]:
+            continue
+        ratio = new["wall_ms_median"] / old["wall_ms_median"]
+        flag = "  <-- regression" if ratio > threshold else ""
+        print(f"{name:45} {old['wall_ms_median']:10.2f} {new['wall_ms_median']:10.2f} {ratio:7.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data_prep functions and w209 routes.")
+    parser.add_argument("--years", type=int, default=11)
+    parser.add_argument("--states", type=int, default=50)
+    parser.add_argument("--readings", type=int, default=1, help="readings per state per day")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run only benchmarks whose name contains this text")
+    parser.add_argument("--out", type=Path, help="write JSON results here")
+    parser.add_argument("--compare", type=Path, help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="median slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_path = write_synthetic_dataset(
+            Path(tmp) / "co_wind_v2.parquet", years=args.years, states=args.states,
+            readings_per_day=args.readings, seed=args.seed,
+        )
+        # Point the app at the synthetic data before it starts loading
+        data_prep.PARQUET_PATH = dataset_path
+        data_prep.registry.path = dataset_path
+        data_prep.registry.snapshot_dir = None
+
+        import w209
+        dataset = w209.registry.get()
+        df, cube = dataset.df, dataset.cube
+        state = data_prep.get_unique_states(df)[0]
+
+        cases = {f"fn {name}": (fn, None) for name, fn in function_cases(dataset_path, dataset, state).items()}
+        cases.update({name: (fn, lambda: w209.clear_caches(None))
+                      for name, fn in endpoint_cases(w209.app, state).items()})
+
+        results = {}
+        for name, (fn, before) in cases.items():
+            if args.only and args.only not in name:
+                continue
+            results[name] = measure(fn, args.repeat, before)
+            print(f"{name:45} {results[name]['wall_ms_median']:10.2f} ms {results[name]['peak_kib']:12.1f} KiB")
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "created": pd.Timestamp.now(tz="UTC").isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "rows": len(df),
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": results,
+    }
+    if args.out:
+        args.out.write_text(json.dumps(output, indent=2))
+        print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        regressions = compare(output, json.loads(args.compare.read_text()), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold}x")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
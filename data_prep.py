@@ -1,16 +1,23 @@
 import pandas as pd
 import numpy as np
-import scipy.stats as stats
-from scipy.stats import linregress
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.dates import DateFormatter
-import matplotlib.dates as mdates
 import os
 import sys
+import hashlib
+import json
+import shutil
+import threading
+import time
 from collections import defaultdict
 from pathlib import Path
 
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:  # fastparquet-only installs load without pushdown or Arrow responses
+    pa = pads = pq = None
+
+import metrics
 
 # Resolve paths relative to this file, no matter where you run Flask from
 BASE_DIR = Path(__file__).resolve().parent
@@ -90,43 +97,210 @@ state_code_to_fips = {
     "WV": "54", "WI": "55", "WY": "56"
 }
 # ---------- Main Load & Prep Function ----------
-def convert_to_parquet(csv_path: Path = CSV_PATH, parquet_path: Path = PARQUET_PATH) -> Path:
-    """Convert CSV → Parquet (fast loads). Creates data dir if needed."""
+
+YEAR_RANGE = (2014, 2024)
+
+# Rows per parquet row group; small enough that year/state filters can skip
+# whole groups, large enough to keep the footer and per-group overhead low.
+ROW_GROUP_SIZE = 128_000
+
+# Set to "year" or "year,state" to have ensure_parquet write a partitioned
+# directory instead of a single file.
+PARQUET_PARTITIONS = tuple(
+    col for col in os.environ.get("CO_DASHBOARD_PARTITION", "").split(",") if col
+)
+
+def convert_to_parquet(csv_path: Path = CSV_PATH, parquet_path: Path = PARQUET_PATH,
+                       partition_by: tuple = (), row_group_size: int = ROW_GROUP_SIZE) -> Path:
+    """
+    Convert CSV → Parquet (fast loads). Creates data dir if needed.
+    Rows are sorted by year, state and date so row-group statistics stay
+    tight. With partition_by (e.g. ("year",) or ("year", "state")) a
+    hive-partitioned directory is written instead of one file.
+    """
     parquet_path.parent.mkdir(parents=True, exist_ok=True)
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV not found: {csv_path} (cwd={Path.cwd()})")
     df = pd.read_csv(csv_path)
-    # requires pyarrow or fastparquet installed
-    df.to_parquet(parquet_path, index=False)
+    df["date_local"] = pd.to_datetime(df["date_local"])
+    df["year"] = df["date_local"].dt.year
+    df = df.sort_values(["year", "state", "date_local"], kind="stable")
+
+    if not partition_by:
+        # requires pyarrow or fastparquet installed
+        df.drop(columns="year").to_parquet(parquet_path, index=False, row_group_size=row_group_size)
+        return parquet_path
+
+    if pads is None:
+        raise ImportError("Writing a partitioned dataset requires pyarrow")
+    if parquet_path.is_file():
+        parquet_path.unlink()
+    pads.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        parquet_path,
+        format="parquet",
+        partitioning=list(partition_by),
+        partitioning_flavor="hive",
+        max_rows_per_group=row_group_size,
+        existing_data_behavior="delete_matching",
+    )
     return parquet_path
 
-def ensure_parquet() -> Path:
-    """Return a path to a ready-to-load Parquet file, converting if needed."""
+def ensure_parquet(partition_by: tuple = PARQUET_PARTITIONS) -> Path:
+    """Return a path to a ready-to-load Parquet file or directory, converting if needed."""
     if PARQUET_PATH.exists():
         return PARQUET_PATH
     if CSV_PATH.exists():
-        return convert_to_parquet(CSV_PATH, PARQUET_PATH)
+        return convert_to_parquet(CSV_PATH, PARQUET_PATH, partition_by=partition_by)
     raise FileNotFoundError(
         f"Neither Parquet nor CSV found.\nTried:\n  {PARQUET_PATH}\n  {CSV_PATH}\n(cwd={Path.cwd()})"
     )
 
-def load_filtered_data(filepath: Path | None = None) -> pd.DataFrame:
+def _data_files(path: Path) -> list:
+    return sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+
+def file_digests(path: Path, names: list | None = None, chunk_size: int = 1 << 20) -> dict:
+    """{relative file name: content hash} of a data file or partitioned directory (or just `names`)."""
+    digests = {}
+    for file in _data_files(path):
+        name = str(file.relative_to(path)) if path.is_dir() else file.name
+        if names is not None and name not in names:
+            continue
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        digests[name] = digest.hexdigest()
+    return digests
+
+def combine_digests(digests: dict) -> str:
+    """The fingerprint of a file or directory from its file_digests()."""
+    digest = hashlib.blake2b(digest_size=16)
+    for name, file_digest in sorted(digests.items()):
+        digest.update(f"{name}\0{file_digest}\n".encode())
+    return digest.hexdigest()
+
+def file_fingerprint(path: Path) -> str:
+    """
+    Content hash of a data file (or partitioned directory); versions
+    everything derived from it. Depends only on the files' names and
+    contents, so a directory grown by appends gets the same version however
+    its fragments were picked up.
+    """
+    return combine_digests(file_digests(path))
+
+def file_stat(path: Path) -> tuple:
+    """(latest mtime_ns, total size) of a data file or partitioned directory."""
+    stats = [file.stat() for file in _data_files(path)]
+    return max(st.st_mtime_ns for st in stats), sum(st.st_size for st in stats)
+
+def file_listing(path: Path) -> dict:
+    """{relative file name: (mtime_ns, size)} of a data file or partitioned directory."""
+    listing = {}
+    for file in _data_files(path):
+        st = file.stat()
+        listing[str(file.relative_to(path)) if path.is_dir() else file.name] = (st.st_mtime_ns, st.st_size)
+    return listing
+
+def appended_files(old: dict, new: dict) -> list:
+    """Files in listing `new` that are not in `old`, if every file of `old` is unchanged; else []."""
+    if not old or any(new.get(name) != tuple(entry[:2]) for name, entry in old.items()):
+        return []
+    return sorted(set(new) - set(old))
+
+def _with_digests(listing: dict, digests: dict) -> dict:
+    # Dataset.files: {name: (mtime_ns, size, content hash or None if not taken)}
+    return {name: (*entry, digests.get(name)) for name, entry in listing.items()}
+
+def _parquet_dataset(path: Path, files: list | None = None):
+    # A pyarrow dataset over the file, the directory, or the given files of it
+    if files:
+        return pads.dataset([str(path / file) for file in files], format="parquet",
+                            partitioning="hive", partition_base_dir=str(path))
+    return pads.dataset(path, format="parquet", partitioning="hive")
+
+def _parquet_filter(dataset, years: tuple = YEAR_RANGE, states: list | None = None):
+    # The pushed-down year/state condition for a pyarrow dataset, or None
+    names = dataset.schema.names
+    lo, hi = years
+
+    conditions = []
+    if "year" in names:
+        conditions.append((pads.field("year") >= lo) & (pads.field("year") <= hi))
+    else:
+        date_type = dataset.schema.field("date_local").type
+        if pa.types.is_timestamp(date_type) and date_type.tz is None:
+            start = pa.scalar(pd.Timestamp(lo, 1, 1).to_pydatetime(), type=date_type)
+            stop = pa.scalar(pd.Timestamp(hi + 1, 1, 1).to_pydatetime(), type=date_type)
+            conditions.append((pads.field("date_local") >= start) & (pads.field("date_local") < stop))
+    if states:
+        conditions.append(pads.field("state").isin(list(states)))
+
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+    return condition
+
+def _parquet_columns(dataset, columns: list | None):
+    if columns is None:
+        return None
+    names = dataset.schema.names
+    return [col for col in dict.fromkeys(["state", "date_local", *columns]) if col in names]
+
+def read_parquet_filtered(path: Path, columns: list | None = None,
+                          years: tuple = YEAR_RANGE, states: list | None = None,
+                          files: list | None = None) -> pd.DataFrame:
+    """
+    Read a parquet file or partitioned directory, pushing the year range,
+    the optional state list and the column projection down to the reader.
+    Partitions and row groups outside the filter are never decoded. The
+    year filter is only pushed down when the file stores typed dates or a
+    year partition; callers still apply it after parsing. `files` reads
+    only those files (relative names) of a directory.
+    """
+    if pads is None:
+        sources = [path / file for file in files] if files else [path]
+        df = pd.concat([pd.read_parquet(src, columns=columns) for src in sources], ignore_index=True)
+        return df[df["state"].isin(states)] if states else df
+
+    dataset = _parquet_dataset(path, files)
+    return dataset.to_table(columns=_parquet_columns(dataset, columns),
+                            filter=_parquet_filter(dataset, years, states)).to_pandas()
+
+def load_filtered_data(filepath: Path | None = None, compact: bool = False,
+                       columns: list | None = None, states: list | None = None,
+                       files: list | None = None) -> pd.DataFrame:
     """
     Load the dataset (prefers Parquet). If no path is given, ensures/uses PARQUET_PATH.
+    With compact=True the frame uses the compact layout (see compact_schema).
+    `columns` limits the source columns read and `states` reads only those
+    states; for Parquet both are pushed down to the reader. `files` loads
+    only those fragments of a Parquet directory (see append_readings).
     """
     path = Path(filepath) if filepath else ensure_parquet()
 
     # Load based on extension
     if path.suffix.lower() == ".parquet":
-        df = pd.read_parquet(path)          # needs pyarrow/fastparquet
+        df = read_parquet_filtered(path, columns=columns, states=states, files=files)
     elif path.suffix.lower() == ".csv":
-        df = pd.read_csv(path)
+        df = pd.read_csv(path, usecols=lambda col: columns is None or col in {"state", "date_local", *columns})
+        if states:
+            df = df[df["state"].isin(states)]
     else:
         raise ValueError(f"Unsupported file type: {path.suffix} @ {path}")
 
-    # --- Filtering & feature engineering ---
+    return prepare_rows(df, compact=compact)
+
+def prepare_rows(df: pd.DataFrame, compact: bool = False) -> pd.DataFrame:
+    """
+    Parse dates, keep YEAR_RANGE and add the derived columns (or convert to
+    the compact layout) for raw rows as read from the data file.
+    """
     df["date_local"] = pd.to_datetime(df["date_local"])
-    df = df[(df["date_local"].dt.year >= 2014) & (df["date_local"].dt.year <= 2024)].copy()
+    df = df[(df["date_local"].dt.year >= YEAR_RANGE[0]) & (df["date_local"].dt.year <= YEAR_RANGE[1])].copy()
+
+    if compact:
+        return compact_schema(df)
 
     df["date"] = df["date_local"].dt.strftime("%Y-%m-%d")
     df["year"] = df["date_local"].dt.year
@@ -139,6 +313,839 @@ def load_filtered_data(filepath: Path | None = None) -> pd.DataFrame:
     return df
 
 
+def compact_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Feature-engineer `df` into the compact layout: categoricals for the
+    state/region/season dimensions, int16/int8 year and month, float32
+    measurements, and no per-row date strings (`date` and `year_month` are
+    derived from date_local when serializing, see DERIVED_EXPORT_COLUMNS).
+    """
+    df["state"] = df["state"].astype("category")
+    df["year"] = df["date_local"].dt.year.astype("int16")
+    df["month"] = df["date_local"].dt.month.astype("int8")
+    for col in ["avg_measurement", "avg_wind_speed", "avg_wind_dir"]:
+        if col in df.columns:
+            df[col] = df[col].astype("float32")
+
+    # Mapping a categorical only evaluates each category once
+    df["season"] = df["month"].map({m: assign_season(m) for m in range(1, 13)}).astype("category")
+    df["region"] = df["state"].map(assign_region).astype("category")
+    df["state_code"] = df["state"].map(state_name_to_code).astype("category")
+    df["state_fips"] = df["state_code"].map(state_code_to_fips).astype("category")
+
+    # Keep categories in lexical order so groupby output sorts like strings
+    for col in ["state_code", "state_fips"]:
+        df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+def memory_report(filepath: Path | None = None) -> pd.DataFrame:
+    """Bytes per column of the standard vs the compact layout of the dataset."""
+    standard = load_filtered_data(filepath).memory_usage(deep=True, index=False)
+    compact = load_filtered_data(filepath, compact=True).memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({"standard_bytes": standard, "compact_bytes": compact})
+    report = report.reindex(standard.index).fillna(0).astype("int64")
+    report.loc["total"] = report.sum()
+    report["ratio"] = (report["compact_bytes"] / report["standard_bytes"]).round(3)
+    return report
+
+
+# ---------- Aggregate Cube ----------
+
+CUBE_KEYS = ["state", "year", "month"]
+CUBE_MEASURES = ["avg_measurement", "avg_wind_speed", "avg_wind_dir"]
+
+def build_aggregate_cube(df):
+    """
+    Collapse the daily rows into mergeable statistics per state × year × month.
+    For each measure: count (_n), sum (_sum) and sum of squares (_sumsq) of the
+    non-null values. The pair_* columns cover rows where both CO and wind speed
+    are present (for correlations), and uv_* sum the wind's u/v components
+    (for wind vectors). Rows with a missing state are kept so that
+    national roll-ups still see every reading.
+    """
+    sums = df[CUBE_KEYS].copy()
+    sums["n_rows"] = 1
+
+    for col in CUBE_MEASURES:
+        if col not in df.columns:
+            continue
+        values = df[col].astype(float)
+        sums[f"{col}_n"] = values.notna().astype("int64")
+        sums[f"{col}_sum"] = values.fillna(0.0)
+        sums[f"{col}_sumsq"] = (values ** 2).fillna(0.0)
+
+    if "avg_wind_dir" in df.columns:
+        # Wind velocity components for vector (circular) means of direction
+        speed = df["avg_wind_speed"].astype(float)
+        radians = np.deg2rad(df["avg_wind_dir"].astype(float))
+        valid = speed.notna() & radians.notna()
+        sums["uv_n"] = valid.astype("int64")
+        sums["uv_sum_u"] = (speed * np.sin(radians)).where(valid, 0.0)
+        sums["uv_sum_v"] = (speed * np.cos(radians)).where(valid, 0.0)
+
+    paired = df["avg_measurement"].notna() & df["avg_wind_speed"].notna()
+    co = df["avg_measurement"].astype(float).where(paired, 0.0)
+    wind = df["avg_wind_speed"].astype(float).where(paired, 0.0)
+    sums["pair_n"] = paired.astype("int64")
+    sums["pair_sum_co"] = co
+    sums["pair_sum_wind"] = wind
+    sums["pair_sumsq_co"] = co ** 2
+    sums["pair_sumsq_wind"] = wind ** 2
+    sums["pair_sum_co_wind"] = co * wind
+
+    cube = sums.groupby(CUBE_KEYS, dropna=False, observed=True).sum().reset_index()
+    if isinstance(cube["state"].dtype, pd.CategoricalDtype):
+        # The cube is small; plain keys keep every roll-up sorting like strings
+        cube["state"] = cube["state"].astype(object)
+    return _add_cube_attributes(cube)
+
+def as_cube(data):
+    """
+    `data` itself if it is an aggregate cube, else the cube of a frame of
+    daily rows. Lets the roll-up helpers that used to take the rows keep
+    accepting them.
+    """
+    return data if "n_rows" in data.columns else build_aggregate_cube(data)
+
+def _add_cube_attributes(cube):
+    cube["season"] = cube["month"].map(assign_season)
+    cube["region"] = cube["state"].map(assign_region)
+    cube["state_code"] = cube["state"].map(state_name_to_code)
+    cube["state_fips"] = cube["state_code"].map(state_code_to_fips)
+    return cube
+
+def _cube_stat_columns(cube):
+    return [
+        col for col in cube.columns
+        if col == "n_rows" or col.startswith(("pair_", "uv_")) or col.rsplit("_", 1)[0] in CUBE_MEASURES
+    ]
+
+def merge_cubes(*cubes):
+    """
+    Combine the cubes of separate batches of rows: the statistics of
+    matching state × year × month cells add up.
+    """
+    stat_cols = list(dict.fromkeys(col for cube in cubes for col in _cube_stat_columns(cube)))
+    combined = pd.concat([cube[CUBE_KEYS + _cube_stat_columns(cube)] for cube in cubes], ignore_index=True)
+    merged = combined.groupby(CUBE_KEYS, dropna=False)[stat_cols].sum().reset_index()
+    return _add_cube_attributes(merged)
+
+def rollup_cube(cube, by):
+    """
+    Sum the cube's statistics over the `by` dimensions and derive the mean of
+    each measure. Groups with keys that are null are dropped, like groupby().
+    """
+    stat_cols = _cube_stat_columns(cube)
+    rolled = cube.groupby(by, observed=True)[stat_cols].sum().reset_index()
+
+    for col in CUBE_MEASURES:
+        if f"{col}_n" in rolled.columns:
+            count = rolled[f"{col}_n"]
+            rolled[col] = rolled[f"{col}_sum"] / count.where(count > 0)
+
+    return rolled
+
+
+# ---------- Incremental Ingestion ----------
+
+RAW_REQUIRED_COLUMNS = ["state", "date_local", "avg_measurement", "avg_wind_speed"]
+RAW_MEASURE_RANGES = {
+    "avg_measurement": (0, None),
+    "avg_wind_speed": (0, None),
+    "avg_wind_dir": (0, 360),
+}
+
+def validate_readings(batch: pd.DataFrame, schema: list | None = None,
+                      known_states: set | None = None) -> pd.DataFrame:
+    """
+    Check a batch of raw daily readings (the columns of co_wind_v2.csv)
+    and return it with parsed dates and numeric measures, limited to and
+    ordered like the columns in `schema`. With `known_states`, states not
+    in it are refused, so a misspelt name doesn't become a new state.
+    Raises ValueError listing every problem found.
+    """
+    missing = [col for col in RAW_REQUIRED_COLUMNS if col not in batch.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    if batch.empty:
+        raise ValueError("No rows to append")
+
+    problems = []
+    if schema is not None:
+        unknown = [col for col in batch.columns if col not in schema]
+        if unknown:
+            problems.append(f"unknown columns {', '.join(map(str, unknown))}")
+
+    batch = batch.copy()
+    states = batch["state"].astype("string").str.strip()
+    if (states.isna() | (states == "")).any():
+        problems.append(f"{int((states.isna() | (states == '')).sum())} rows without a state")
+    if known_states is not None:
+        unknown = sorted(set(batch["state"].dropna()) - set(known_states))
+        if unknown:
+            problems.append(f"unknown states {', '.join(map(repr, unknown))} "
+                            "(pass --allow-new-states if they are new)")
+
+    dates = pd.to_datetime(batch["date_local"], errors="coerce")
+    if dates.isna().any():
+        problems.append(f"{int(dates.isna().sum())} rows with a missing or unreadable date_local")
+    outside = dates.notna() & ~dates.dt.year.between(*YEAR_RANGE)
+    if outside.any():
+        problems.append(f"{int(outside.sum())} rows outside {YEAR_RANGE[0]}-{YEAR_RANGE[1]}")
+
+    for col, (lo, hi) in RAW_MEASURE_RANGES.items():
+        if col not in batch.columns:
+            continue
+        values = pd.to_numeric(batch[col], errors="coerce")
+        if (values.isna() & batch[col].notna()).any():
+            problems.append(f"non-numeric {col} values")
+        if (values < lo).any() or (hi is not None and (values > hi).any()):
+            problems.append(f"{col} values outside [{lo}, {hi if hi is not None else 'inf'}]")
+        batch[col] = values.astype(float)
+
+    if problems:
+        raise ValueError("Invalid readings: " + "; ".join(problems))
+
+    batch["date_local"] = dates
+    if schema is not None:
+        batch = batch.reindex(columns=[col for col in schema if col in batch.columns or col in RAW_MEASURE_RANGES])
+    return batch
+
+def _partition_columns(path: Path) -> list:
+    # Hive partition keys of a directory dataset, from its first file's path
+    files = _data_files(path)
+    if not files:
+        return []
+    return [part.split("=", 1)[0] for part in files[0].relative_to(path).parts[:-1] if "=" in part]
+
+def _file_to_directory(path: Path) -> None:
+    # Keep the name; the existing file becomes the directory's first fragment
+    moved = path.with_name(f".{path.name}.{time.time_ns()}")
+    os.replace(path, moved)
+    path.mkdir()
+    os.replace(moved, path / "part-0.parquet")
+
+def append_readings(batch: pd.DataFrame, path: Path | None = None,
+                    allow_new_states: bool = False) -> list:
+    """
+    Validate a batch of raw daily rows and add it to the Parquet dataset as
+    new fragment files, leaving the existing files untouched; returns the
+    new files. States must already be in the dataset or in the state/region
+    map unless allow_new_states is set. A single-file dataset becomes a
+    directory (the file is its first fragment) on the first append. Servers
+    with hot reload on fold the new fragments into their loaded version
+    without re-reading the rest (see DatasetRegistry).
+    """
+    if pads is None:
+        raise ImportError("Appending to the dataset requires pyarrow")
+    path = Path(path) if path else ensure_parquet()
+    if path.suffix.lower() != ".parquet":
+        raise ValueError(f"Appends need a Parquet dataset, got {path}")
+    if path.is_file():
+        _file_to_directory(path)
+
+    dataset = pads.dataset(path, format="parquet", partitioning="hive")
+    schema = dataset.schema
+    partitions = _partition_columns(path)
+    known_states = None
+    if not allow_new_states:
+        existing = dataset.to_table(columns=["state"]).column("state").unique().to_pylist()
+        known_states = set(existing) | set(state_name_to_code)
+    batch = validate_readings(batch, schema=schema.names, known_states=known_states)
+    if "year" in schema.names:
+        batch["year"] = batch["date_local"].dt.year
+    batch = batch.sort_values([col for col in ["year", "state", "date_local"] if col in batch.columns],
+                              kind="stable")
+
+    if pa.types.is_string(schema.field("date_local").type) or pa.types.is_large_string(schema.field("date_local").type):
+        batch["date_local"] = batch["date_local"].dt.strftime("%Y-%m-%d")  # as in the source CSV
+
+    table = pa.Table.from_pandas(batch, preserve_index=False)
+    table = table.cast(pa.schema([schema.field(name) for name in table.column_names]))
+
+    # Written next to the dataset, then moved in, so readers never see a partial file
+    stamp = time.time_ns()
+    staging = path.with_name(f".{path.name}.append-{stamp}")
+    pads.write_dataset(
+        table, staging, format="parquet",
+        partitioning=partitions or None,
+        partitioning_flavor="hive" if partitions else None,
+        basename_template=f"append-{stamp}-{{i}}.parquet",
+        max_rows_per_group=ROW_GROUP_SIZE,
+    )
+    written = []
+    for file in _data_files(staging):
+        target = path / file.relative_to(staging)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(file, target)
+        written.append(target)
+    shutil.rmtree(staging, ignore_errors=True)
+    return written
+
+
+# ---------- State/Date Index ----------
+
+INDEX_COLUMNS = ["state", "date_local"]
+
+def _sorted_by_state_date(df):
+    codes, _ = pd.factorize(df["state"], sort=True)
+    codes = np.where(codes < 0, codes.max(initial=0) + 1, codes)  # missing states sort last
+    dates = df["date_local"].to_numpy()
+    same = codes[1:] == codes[:-1]
+    return bool(np.all(codes[1:] >= codes[:-1]) and np.all(dates[1:][same] >= dates[:-1][same]))
+
+def sort_rows(df):
+    """df ordered by state, then date (stable); returned as is when already in that order."""
+    if _sorted_by_state_date(df):
+        return df
+    return df.sort_values(INDEX_COLUMNS, kind="stable", ignore_index=True)
+
+class RowIndex:
+    """
+    Offsets into a frame sorted by sort_rows: each state's rows are one
+    contiguous run in date order, so state and date filters are binary
+    searches that give row slices instead of boolean masks over the frame.
+    """
+
+    def __init__(self, df):
+        codes, uniques = pd.factorize(df["state"])
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], int)
+        stops = np.r_[starts[1:], len(codes)]
+        self.runs = [(int(start), int(stop)) for start, stop in zip(starts, stops)]
+        self.bounds = {uniques[codes[start]]: run for start, run in zip(starts, self.runs) if codes[start] >= 0}
+        self.dates = df["date_local"].to_numpy()
+        self.n_rows = len(df)
+
+    def _date(self, value):
+        return pd.Timestamp(value).to_datetime64().astype(self.dates.dtype)
+
+    def slices(self, states=None, start=None, end=None):
+        """
+        Row slices for the given states (all rows when None, missing states
+        included) and inclusive date range, in frame order.
+        """
+        if states is None and start is None and end is None:
+            return [slice(0, self.n_rows)]
+        if states is None:
+            runs = self.runs
+        else:
+            runs = [self.bounds[state] for state in dict.fromkeys(states) if state in self.bounds]
+            runs.sort()
+
+        slices = []
+        for lo, hi in runs:
+            dates = self.dates[lo:hi]
+            first = lo + (np.searchsorted(dates, self._date(start), "left") if start is not None else 0)
+            last = lo + (np.searchsorted(dates, self._date(end), "right") if end is not None else hi - lo)
+            if first < last:
+                slices.append(slice(int(first), int(last)))
+        return slices
+
+    def positions(self, states=None, start=None, end=None):
+        """slices() as an array of row positions."""
+        slices = self.slices(states, start, end)
+        starts = np.array([s.start for s in slices], dtype=np.int64)
+        lengths = np.array([s.stop - s.start for s in slices], dtype=np.int64)
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return offsets + np.arange(lengths.sum(), dtype=np.int64)
+
+
+# ---------- Out-of-Core Aggregation ----------
+
+# Memory, in MB, the processed rows of one batch may take when the data is
+# streamed instead of loaded whole (CO_DASHBOARD_MEMORY_BUDGET_MB)
+MEMORY_BUDGET = int(os.environ.get("CO_DASHBOARD_MEMORY_BUDGET_MB", "256")) * 1024 * 1024
+
+# A batch is held several times over while it is aggregated: the Arrow
+# batch, the raw and processed frames, the sorted copy and the groupby
+# intermediates. Batch sizes are divided by this.
+BATCH_MEMORY_FACTOR = 6
+
+# Rows read up front to measure the processed size of a row
+SAMPLE_ROWS = 10_000
+
+def _batch_rows(sample: pd.DataFrame, compact: bool, memory_budget: int) -> int:
+    rows = prepare_rows(sample, compact=compact)
+    if rows.empty:
+        return SAMPLE_ROWS
+    row_bytes = rows.memory_usage(deep=True).sum() / len(rows)
+    return max(int(memory_budget / (row_bytes * BATCH_MEMORY_FACTOR)), 1_000)
+
+def iter_batches(filepath: Path | None = None, compact: bool = False, columns: list | None = None,
+                 states: list | None = None, start=None, end=None, files: list | None = None,
+                 memory_budget: int = MEMORY_BUDGET):
+    """
+    Yield the rows load_filtered_data would return, processed the same way,
+    as a series of frames whose size is picked so that one batch stays
+    within memory_budget bytes. Parquet is streamed by pyarrow with the
+    year, state and column filters pushed down; CSV is read in chunks.
+    `start`/`end` keep an inclusive date_local range. Rows come in file
+    order.
+    """
+    path = Path(filepath) if filepath else ensure_parquet()
+    years = (max(YEAR_RANGE[0], pd.Timestamp(start).year) if start is not None else YEAR_RANGE[0],
+             min(YEAR_RANGE[1], pd.Timestamp(end).year) if end is not None else YEAR_RANGE[1])
+
+    if path.suffix.lower() == ".parquet":
+        if pads is None:
+            raise ImportError("Streaming the dataset requires pyarrow")
+        dataset = _parquet_dataset(path, files)
+        columns, condition = _parquet_columns(dataset, columns), _parquet_filter(dataset, years, states)
+        sample = dataset.head(SAMPLE_ROWS, columns=columns, filter=condition).to_pandas()
+        # Readahead is kept to one batch so the reader doesn't queue up
+        # more decoded data than the budget allows
+        scanner = dataset.scanner(columns=columns, filter=condition,
+                                  batch_size=_batch_rows(sample, compact, memory_budget),
+                                  batch_readahead=1, fragment_readahead=1)
+        chunks = (batch.to_pandas() for batch in scanner.to_batches())
+    elif path.suffix.lower() == ".csv":
+        usecols = lambda col: columns is None or col in {"state", "date_local", *columns}
+        sample = pd.read_csv(path, usecols=usecols, nrows=SAMPLE_ROWS)
+        chunks = pd.read_csv(path, usecols=usecols, chunksize=_batch_rows(sample, compact, memory_budget))
+    else:
+        raise ValueError(f"Unsupported file type: {path.suffix} @ {path}")
+
+    for chunk in chunks:
+        if states and path.suffix.lower() == ".csv":
+            chunk = chunk[chunk["state"].isin(states)]
+        if chunk.empty:
+            continue
+        rows = prepare_rows(chunk, compact=compact)
+        if start is not None:
+            rows = rows[rows["date_local"] >= pd.Timestamp(start)]
+        if end is not None:
+            rows = rows[rows["date_local"] <= pd.Timestamp(end)]
+        if not rows.empty:
+            yield rows.reset_index(drop=True)
+
+def fold_batches(batches, builder, merge):
+    """merge() the builder(batch) results of every batch; None when there are none."""
+    result = None
+    for batch in batches:
+        value = builder(batch)
+        result = value if result is None else merge(result, value)
+    return result
+
+
+# ---------- Dataset Registry ----------
+
+class Dataset:
+    """
+    One loaded version of the data file plus everything derived from it.
+    An out_of_core dataset keeps no rows (df is empty): only the cube and
+    the aggregates folded in by DatasetRegistry are available.
+    """
+
+    def __init__(self, path: Path | None, df: pd.DataFrame, version: str, stat: tuple,
+                 cube: pd.DataFrame | None = None, files: dict | None = None,
+                 out_of_core: bool = False):
+        self.path = path
+        self.out_of_core = out_of_core
+        self.df = sort_rows(df)
+        self.index = RowIndex(self.df)
+        self.version = version
+        self.mtime_ns, self.size = stat
+        self.files = files or {}  # file_listing() of the data this version was loaded from, plus digests
+        self.cube = build_aggregate_cube(df) if cube is None else cube
+        self.derived = {}
+        self.mergeable = {}
+
+    def rows(self, states=None, start=None, end=None):
+        """
+        The rows of the given states and inclusive date range. A single run
+        of rows (one state, or no filter) comes back as a slice of df rather
+        than a copy.
+        """
+        slices = self.index.slices(states, start, end)
+        if len(slices) == 1:
+            return self.df.iloc[slices[0]]
+        return self.df.take(self.index.positions(states, start, end))
+
+    def get_derived(self, name, builder, merge=None):
+        """
+        Memoize builder(dataset) under `name` for the lifetime of this version.
+        With merge, the value carries over to versions made by extend() as
+        merge(value, builder(dataset of the new rows)).
+        """
+        if name not in self.derived:
+            self.derived.setdefault(name, builder(self))
+        if merge is not None:
+            self.mergeable.setdefault(name, (builder, merge))
+        return self.derived[name]
+
+    def extend(self, delta: pd.DataFrame, version: str, stat: tuple, files: dict) -> "Dataset":
+        """
+        A new version with the processed rows of `delta` appended. The cube
+        and the mergeable derived values are updated from the new rows
+        alone; other derived values are rebuilt on demand as usual.
+        """
+        added = Dataset(None, delta, version, stat)
+        df = self.df if self.out_of_core else append_rows(self.df, delta)
+        extended = Dataset(self.path, df, version, stat, cube=merge_cubes(self.cube, added.cube),
+                           files=files, out_of_core=self.out_of_core)
+        for name, (builder, merge) in self.mergeable.items():
+            if name in self.derived:
+                extended.derived[name] = merge(self.derived[name], builder(added))
+        extended.mergeable = dict(self.mergeable)
+        return extended
+
+
+def append_rows(df: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """df with delta's rows appended; categorical columns stay categorical."""
+    delta = delta.reindex(columns=df.columns)
+    for col in df.columns:
+        dtype = df[col].dtype
+        if not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        new_values = pd.Index(delta[col].dropna().unique()).difference(dtype.categories)
+        if len(new_values):
+            dtype = pd.CategoricalDtype(dtype.categories.append(new_values).sort_values())
+            df = df.assign(**{col: df[col].astype(dtype)})
+        delta[col] = delta[col].astype(dtype)
+    return pd.concat([df, delta], ignore_index=True)
+
+
+SNAPSHOT_DIR = DATA_DIR / "snapshot"
+
+def build_snapshot(snapshot_dir: Path = SNAPSHOT_DIR, filepath: Path | None = None,
+                   compact: bool = False) -> Path:
+    """
+    Save the processed frame and its aggregate cube as Arrow (feather)
+    files, plus a meta.json tying them to the source file. Workers boot from
+    the snapshot while the source is unchanged and skip the parquet parse
+    and feature engineering.
+    """
+    path = Path(filepath) if filepath else ensure_parquet()
+    df = sort_rows(load_filtered_data(path, compact=compact).reset_index(drop=True))
+    cube = build_aggregate_cube(df)
+
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    df.to_feather(snapshot_dir / "frame.feather")
+    cube.to_feather(snapshot_dir / "cube.feather")
+
+    mtime_ns, size = file_stat(path)
+    digests = file_digests(path)
+    meta = {
+        "source": path.name,
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "version": combine_digests(digests),
+        "digests": digests,
+        "compact": compact,
+    }
+    # Written last so a half-built snapshot is never picked up
+    (snapshot_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+    return snapshot_dir
+
+def read_snapshot_meta(snapshot_dir: Path = SNAPSHOT_DIR) -> dict | None:
+    try:
+        return json.loads((snapshot_dir / "meta.json").read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def load_snapshot(snapshot_dir: Path = SNAPSHOT_DIR) -> tuple:
+    """Return the (frame, cube) saved by build_snapshot."""
+    return (
+        pd.read_feather(snapshot_dir / "frame.feather"),
+        pd.read_feather(snapshot_dir / "cube.feather"),
+    )
+
+
+class DatasetRegistry:
+    """
+    Owns the single loaded, feature-engineered frame that every endpoint and
+    helper reads from. A snapshot made by build_snapshot is used when it
+    matches the data file, or when the data file is absent. With hot_reload
+    on, get() re-stats the file at most every check_interval seconds. When
+    the mtime or size moved and the content hash changed, it loads the new
+    version and notifies the on_reload callbacks. When the only change is
+    new fragments in a directory dataset (append_readings), just those are
+    loaded and merged into the current version (Dataset.extend). Requests
+    keep being served from the old version while the new one loads.
+
+    With out_of_core on, the rows are never held whole: the file is
+    streamed in batches of about memory_budget bytes (iter_batches), and
+    the cube and every value declared with aggregate() are built per batch
+    and merged. Snapshots are not used in this mode.
+    """
+
+    def __init__(self, path: Path | None = None, hot_reload: bool = False,
+                 check_interval: float = 5.0, compact: bool = False,
+                 snapshot_dir: Path | None = SNAPSHOT_DIR, out_of_core: bool = False,
+                 memory_budget: int = MEMORY_BUDGET):
+        self.path = Path(path) if path else None
+        self.hot_reload = hot_reload
+        self.compact = compact
+        self.out_of_core = out_of_core
+        self.memory_budget = memory_budget
+        self.snapshot_dir = snapshot_dir
+        self.check_interval = check_interval
+        self.loading = False
+        self.error = None
+        self._dataset = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._listeners = []
+        self._builders = []
+        self._aggregates = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._dataset is not None
+
+    def load_in_background(self) -> threading.Thread:
+        """Load on a daemon thread so the process can answer health checks meanwhile."""
+        def load():
+            try:
+                self.reload()
+            except Exception:
+                pass  # kept in self.error; the next get() retries and raises
+
+        thread = threading.Thread(target=load, name="dataset-load", daemon=True)
+        thread.start()
+        return thread
+
+    def on_reload(self, callback):
+        self._listeners.append(callback)
+        return callback
+
+    def on_load(self, callback):
+        """Run callback(dataset) on every new version, the first included, before it is served."""
+        self._builders.append(callback)
+        return callback
+
+    def aggregate(self, name, builder, merge):
+        """
+        Declare dataset.get_derived(name, builder, merge) as an aggregate:
+        merge must combine the builder results of any split of the rows.
+        Out-of-core loads build it batch by batch. Returns the getter,
+        getter(dataset). Declare aggregates before the first load.
+        """
+        self._aggregates[name] = (builder, merge)
+        return lambda dataset: dataset.get_derived(name, builder, merge)
+
+    def get(self) -> Dataset:
+        dataset = self._dataset
+        if dataset is None:
+            return self.reload()
+        if self.hot_reload and time.monotonic() - self._checked_at >= self.check_interval:
+            # One thread checks (and hashes, if it comes to that); the others
+            # keep being served the current version meanwhile
+            if not self._check_lock.acquire(blocking=False):
+                return dataset
+            try:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    self._checked_at = time.monotonic()
+                    if self._file_changed(dataset):
+                        return self.reload()
+            finally:
+                self._check_lock.release()
+        return dataset
+
+    def _file_changed(self, dataset: Dataset) -> bool:
+        if dataset.path is None:
+            return False
+        try:
+            stat = file_stat(dataset.path)
+        except (FileNotFoundError, ValueError):
+            return False
+        if stat == (dataset.mtime_ns, dataset.size):
+            return False
+        if dataset.path.is_dir() and len(file_listing(dataset.path)) > len(dataset.files):
+            return True  # new fragments only; picked up without hashing the rest
+        if file_fingerprint(dataset.path) == dataset.version:
+            # Touched but not modified; remember the new mtime so we don't rehash
+            dataset.mtime_ns = stat[0]
+            return False
+        return True
+
+    def reload(self, force: bool = False) -> Dataset:
+        """Load the data file unless the loaded version already matches it."""
+        with self._lock:
+            self.loading = True
+            try:
+                current = self._dataset
+                dataset = self._load(current, force)
+                if dataset is not current:
+                    for callback in self._builders:
+                        callback(dataset)
+                self.error = None
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self.loading = False
+            if dataset is current:
+                return current
+            self._dataset = dataset
+            self._checked_at = time.monotonic()
+
+        if current is not None:
+            for callback in self._listeners:
+                callback(dataset)
+        return dataset
+
+    def _load(self, current: Dataset | None, force: bool) -> Dataset:
+        meta = read_snapshot_meta(self.snapshot_dir) if self.snapshot_dir and not self.out_of_core else None
+        if meta is not None and (meta["compact"] != self.compact or "digests" not in meta):
+            meta = None  # other layout, or versioned before per-file digests
+
+        try:
+            path = self.path or ensure_parquet()
+        except FileNotFoundError:
+            if meta is None:
+                raise
+            path = None
+
+        if path is None:
+            stat, version = (meta["mtime_ns"], meta["size"]), meta["version"]
+        else:
+            stat = file_stat(path)
+            if current is not None and not force and current.path == path \
+                    and (current.mtime_ns, current.size) == stat:
+                return current  # loaded (or checked) by the thread before us
+            listing = file_listing(path)
+            old = current.files if current is not None and not force else {}
+            if list(old) == [path.name] and path.is_dir():
+                old = {"part-0.parquet": old[path.name]}  # turned into a directory by append_readings
+            added = appended_files(old, listing)
+            if added:
+                # Only new fragments: load just those and merge them in
+                # (appended fragments are one batch each, so they are read
+                # whole in out-of-core mode too)
+                delta = load_filtered_data(path, compact=self.compact, files=added)
+                # The version is the one file_fingerprint gives the whole
+                # directory; only the new files (and any whose digest a
+                # snapshot didn't record) are hashed
+                digests = {name: entry[2] for name, entry in old.items() if entry[2]}
+                digests.update(file_digests(path, names=set(listing) - set(digests)))
+                return current.extend(delta, combine_digests(digests), stat, _with_digests(listing, digests))
+
+            if meta is not None and (meta["mtime_ns"], meta["size"]) == stat:
+                version, digests = meta["version"], meta.get("digests", {})
+            else:
+                digests = file_digests(path)
+                meta, version = None, combine_digests(digests)
+
+        if current is not None and current.version == version and not force:
+            return current
+
+        files = _with_digests(listing, digests) if path is not None else None
+        if meta is not None:
+            df, cube = load_snapshot(self.snapshot_dir)
+            if "uv_n" not in cube.columns:
+                cube = None  # snapshot from before the cube had wind components
+            return Dataset(path, df, version, stat, cube=cube, files=files)
+        if self.out_of_core:
+            return self._fold(path, version, stat, files)
+        return Dataset(path, load_filtered_data(path, compact=self.compact), version, stat, files=files)
+
+    def _fold(self, path: Path, version: str, stat: tuple, files: dict) -> Dataset:
+        # Stream the file through the cube and the declared aggregates
+        cube, values, empty = None, {}, None
+        for batch in iter_batches(path, compact=self.compact, memory_budget=self.memory_budget):
+            part = Dataset(None, batch, version, stat)
+            cube = part.cube if cube is None else merge_cubes(cube, part.cube)
+            for name, (builder, merge) in self._aggregates.items():
+                value = builder(part)
+                values[name] = merge(values[name], value) if name in values else value
+            empty = batch.iloc[:0]
+        if empty is None:
+            raise ValueError(f"No readings in {YEAR_RANGE} in {path}")
+
+        dataset = Dataset(path, empty, version, stat, cube=cube, files=files, out_of_core=True)
+        dataset.derived.update(values)
+        dataset.mergeable.update(self._aggregates)
+        return dataset
+
+
+# Shared instance; set CO_DASHBOARD_HOT_RELOAD=1 to pick up new data files
+# without restarting the server, CO_DASHBOARD_COMPACT=1 for the compact layout,
+# CO_DASHBOARD_OUT_OF_CORE=1 to stream data that doesn't fit in memory.
+registry = DatasetRegistry(
+    hot_reload=os.environ.get("CO_DASHBOARD_HOT_RELOAD") == "1",
+    compact=os.environ.get("CO_DASHBOARD_COMPACT") == "1",
+    out_of_core=os.environ.get("CO_DASHBOARD_OUT_OF_CORE") == "1",
+)
+
+
+# ---------- Rolling Windows ----------
+
+ROLLING_WINDOW = 12
+ROLLING_COLUMNS = {"avg_measurement": "co", "avg_wind_speed": "wind"}
+
+def grouped_rolling(values, group_ids=None, window=ROLLING_WINDOW, center=False, min_periods=None):
+    """
+    Rolling mean and sample std over `window` rows within each run of equal
+    group_ids (rows sorted by group), from cumulative sums: O(n) whatever
+    the window. NaNs are skipped; windows holding fewer than min_periods
+    (default: window) values are NaN. Same results as
+    Series.groupby(group_ids).rolling(window, center=center, min_periods).
+    """
+    x = np.asarray(values, dtype=float)
+    n = len(x)
+    min_periods = window if min_periods is None else min_periods
+
+    if group_ids is None:
+        first, last = np.zeros(n, dtype=int), np.full(n, n - 1)
+    else:
+        ids = np.asarray(group_ids)
+        change = np.r_[True, ids[1:] != ids[:-1]] if n else np.zeros(0, dtype=bool)
+        run_starts = np.flatnonzero(change)
+        run_ends = np.r_[run_starts[1:], n] - 1
+        run = np.cumsum(change) - 1
+        first, last = run_starts[run], run_ends[run]
+
+    end = np.arange(n) + ((window - 1) // 2 if center else 0)
+    lo = np.maximum(end - window + 1, first)
+    hi = np.minimum(end, last) + 1
+
+    # Sums about the overall mean keep the variance from cancelling
+    valid = ~np.isnan(x)
+    shift = x[valid].mean() if valid.any() else 0.0
+    centred = np.where(valid, x - shift, 0.0)
+    counts = np.r_[0, np.cumsum(valid)]
+    sums = np.r_[0.0, np.cumsum(centred)]
+    sumsqs = np.r_[0.0, np.cumsum(centred ** 2)]
+
+    count = counts[hi] - counts[lo]
+    total = sums[hi] - sums[lo]
+    total_sq = sumsqs[hi] - sumsqs[lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where((count >= min_periods) & (count > 0), total / count + shift, np.nan)
+        var = (total_sq - total ** 2 / count) / (count - 1)
+        std = np.where(count >= max(min_periods, 2), np.sqrt(np.clip(var, 0.0, None)), np.nan)
+    return mean, std
+
+def add_rolling_averages(monthly, window=ROLLING_WINDOW, center=True, min_periods=None,
+                         by=(), std=False, ewm=False):
+    """
+    Add rolling_avg_co / rolling_avg_wind to a monthly frame (sorted by
+    `by`, then date), computed separately within each `by` group. std=True
+    adds rolling_std_*, ewm=True adds ewm_* (exponentially weighted mean
+    with span=window).
+    """
+    min_periods = window if min_periods is None else min_periods
+    ids = monthly.groupby(list(by), sort=False).ngroup().to_numpy() if by else None
+
+    for col, name in ROLLING_COLUMNS.items():
+        mean, sd = grouped_rolling(monthly[col], ids, window, center, min_periods)
+        monthly[f'rolling_avg_{name}'] = mean
+        if std:
+            monthly[f'rolling_std_{name}'] = sd
+        if ewm:
+            values = monthly[col].astype(float)
+            if by:
+                smoothed = (values.groupby(ids).ewm(span=window, min_periods=min_periods).mean()
+                            .reset_index(level=0, drop=True))
+            else:
+                smoothed = values.ewm(span=window, min_periods=min_periods).mean()
+            monthly[f'ewm_{name}'] = smoothed
+
+    return monthly
+
 # ---------- Data Aggregation Functions ----------
 
 def get_monthly_averages(df, state=None):
@@ -154,17 +1161,45 @@ def get_monthly_averages(df, state=None):
     monthly['date'] = pd.to_datetime(monthly['year_month'])
     monthly = monthly.sort_values('date')
 
-    # Add rolling averages
-    monthly['rolling_avg_co'] = monthly['avg_measurement'].rolling(window=12, center=True, min_periods=12).mean()
-    monthly['rolling_avg_wind'] = monthly['avg_wind_speed'].rolling(window=12, center=True, min_periods=12).mean()
-    
-    return monthly
+    return add_rolling_averages(monthly)
+
+def _cube_monthly(cube, keys):
+    monthly = rollup_cube(cube, [*keys, 'year', 'month'])
+    monthly['year_month'] = (
+        monthly['year'].astype(str) + '-' + monthly['month'].astype(str).str.zfill(2)
+    )
+    monthly = monthly[[*keys, 'year_month', 'avg_measurement', 'avg_wind_speed']].copy()
+
+    monthly['date'] = pd.to_datetime(monthly['year_month'])
+    return monthly.sort_values([*keys, 'date'])
+
+def get_cube_monthly_averages(cube, state=None, **rolling):
+    """
+    Same frame as get_monthly_averages, rolled up from the aggregate cube
+    instead of the daily rows. `rolling` goes to add_rolling_averages.
+    """
+    if state:
+        cube = cube[cube['state'] == state]
+
+    return add_rolling_averages(_cube_monthly(cube, []), **rolling)
+
+def get_all_state_monthly_averages(cube, **rolling):
+    """
+    get_cube_monthly_averages for every state at once, in one frame with a
+    state column, sorted by state and date.
+    """
+    monthly = _cube_monthly(cube, ['state']).reset_index(drop=True)
+    return add_rolling_averages(monthly, by=['state'], **rolling)
+
+def split_by_state(monthly):
+    """{state: rows without the state column} from get_all_state_monthly_averages."""
+    return {state: rows.drop(columns="state") for state, rows in monthly.groupby("state", sort=False)}
 
 def get_state_monthly_averages(df, use_rolling=False):
     df = df.copy()
     df['year_month'] = pd.to_datetime(df['date_local']).dt.to_period('M').astype(str)
 
-    monthly = df.groupby(['state', 'year_month']).agg({
+    monthly = df.groupby(['state', 'year_month'], observed=True).agg({
         'avg_measurement': 'mean',
         'avg_wind_speed': 'mean'
     }).reset_index()
@@ -172,19 +1207,14 @@ def get_state_monthly_averages(df, use_rolling=False):
     monthly['date'] = pd.to_datetime(monthly['year_month'])
 
     if use_rolling:
-        monthly['avg_measurement'] = (
-            monthly.groupby('state')['avg_measurement']
-            .transform(lambda x: x.rolling(12, min_periods=12).mean())
-        )
-        monthly['avg_wind_speed'] = (
-            monthly.groupby('state')['avg_wind_speed']
-            .transform(lambda x: x.rolling(12, min_periods=12).mean())
-        )
+        # Trailing 12-month means per state (rows are sorted by state, then month)
+        for col in ['avg_measurement', 'avg_wind_speed']:
+            monthly[col], _ = grouped_rolling(monthly[col], monthly['state'].to_numpy(), center=False)
 
     return monthly
 
 def get_monthly_avg_by_region(df):
-    monthly_avg = df.groupby(['year_month', 'region']).agg({
+    monthly_avg = df.groupby(['year_month', 'region'], observed=True).agg({
         'avg_measurement': 'mean',
         'avg_wind_speed': 'mean'
     }).reset_index()
@@ -194,29 +1224,25 @@ def get_monthly_avg_by_region(df):
     
     return monthly_avg
 
-def get_seasonal_avg_by_region(df):
-    seasonal_avg = df.groupby(['season', 'region']).agg({
-        'avg_measurement': 'mean',
-        'avg_wind_speed': 'mean'
-    }).reset_index()
+def get_seasonal_avg_by_region(cube):
+    # Takes the aggregate cube, or daily rows (see as_cube)
+    seasonal_avg = rollup_cube(as_cube(cube), ['season', 'region'])
 
-    return seasonal_avg
+    return seasonal_avg[['season', 'region', 'avg_measurement', 'avg_wind_speed']]
 
 def get_yearly_trends(df):
-    yearly_trends = df.groupby(['year', 'region']).agg({
+    yearly_trends = df.groupby(['year', 'region'], observed=True).agg({
         'avg_measurement': 'mean',
         'avg_wind_speed': 'mean'
     }).reset_index()
 
     return yearly_trends
 
-def get_state_averages_with_trend():
-    df = load_filtered_data()
+def get_state_averages_with_trend(cube=None):
+    if cube is None:
+        cube = registry.get().cube
 
-    grouped = df.groupby("state").agg({
-        "avg_measurement": "mean",
-        "avg_wind_speed": "mean"
-    }).reset_index()
+    grouped = rollup_cube(cube, ["state"])[["state", "avg_measurement", "avg_wind_speed"]]
 
     grouped["avg_measurement"] = grouped["avg_measurement"].round(3)
     grouped["avg_wind_speed"] = grouped["avg_wind_speed"].round(1)
@@ -225,6 +1251,8 @@ def get_state_averages_with_trend():
     # Linear regression
     x = grouped["avg_wind_speed"]
     y = grouped["avg_measurement"]
+    from scipy.stats import linregress  # deferred: scipy.stats costs ~1s at import
+
     slope, intercept, r_value, p_value, std_err = linregress(x, y)
 
     trend = {
@@ -236,111 +1264,165 @@ def get_state_averages_with_trend():
     }
 
     return {
-        "averages": grouped.to_dict(orient="records"),
+        "averages": grouped,
         "trend": trend,
         "correlation": r_value
     }
 
-def get_wind_rose_data(df, state=None):
-    filtered_df = df.copy()
+# ---------- Wind Rose Binning ----------
 
-    # Optional filtering by state
-    if state:
-        filtered_df = filtered_df[filtered_df['state'] == state]
+DEFAULT_DIRECTION_BINS = 16
+WIND_DIR_COLUMNS = ['avg_wind_dir', 'WDF1', 'WDF2', 'WDF5', 'WDFG']
 
-    # Binning logic (as you already wrote)
-    available_cols = [col for col in ['avg_wind_dir', 'WDF1', 'WDF2', 'WDF5', 'WDFG'] if col in filtered_df.columns]
-    if not available_cols:
-        return []
+WIND_SPEED_EDGES = (10, 20, 30, 40)
+WIND_SPEED_LABELS = (
+    'Light (<10)', 'Moderate (10-20)', 'Strong (20-30)', 'Very Strong (30-40)', 'Extreme (>40)'
+)
+CO_EDGES = (0.1, 0.2, 0.3, 0.4)
+CO_LABELS = (
+    'Very Low (<0.1)', 'Low (0.1-0.2)', 'Moderate (0.2-0.3)', 'High (0.3-0.4)', 'Very High (>0.4)'
+)
 
-    wind_dir_col = available_cols[0]
-    filtered_df = filtered_df.dropna(subset=[wind_dir_col, 'avg_wind_speed'])
+def bin_wind_direction(degrees, n_bins=DEFAULT_DIRECTION_BINS):
+    """Direction sector of each reading, 0 = north, counting clockwise."""
+    degrees = np.asarray(degrees, dtype=float)
+    return np.floor(np.mod(degrees, 360) / (360 / n_bins)).astype(int)
 
-    def bin_wind_direction(degrees, n_bins=16):
-        return int(np.floor(degrees % 360 / (360 / n_bins)))
+def categorize(values, edges):
+    """
+    Category index of each value: 0 below edges[0], i for
+    edges[i-1] <= value < edges[i], len(edges) from the last edge up.
+    """
+    return np.digitize(np.asarray(values, dtype=float), edges)
 
-    def categorize_wind_speed(speed):
-        if speed < 10: return 'Light (<10)'
-        elif speed < 20: return 'Moderate (10-20)'
-        elif speed < 30: return 'Strong (20-30)'
-        elif speed < 40: return 'Very Strong (30-40)'
-        else: return 'Extreme (>40)'
+def category_labels(edges):
+    labels = [f"<{edges[0]:g}"]
+    labels += [f"{lo:g}-{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])]
+    labels.append(f">{edges[-1]:g}")
+    return tuple(labels)
 
-    filtered_df['direction_bin'] = filtered_df[wind_dir_col].apply(bin_wind_direction)
-    filtered_df['speed_category'] = filtered_df['avg_wind_speed'].apply(categorize_wind_speed)
+def resolve_category_spec(data_type, edges=None):
+    """Return (edges, labels) for 'wind' or 'co', falling back to the dashboard defaults."""
+    if data_type == "wind":
+        default_edges, default_labels = WIND_SPEED_EDGES, WIND_SPEED_LABELS
+    else:
+        default_edges, default_labels = CO_EDGES, CO_LABELS
 
-    counts = (
-        filtered_df.groupby(['direction_bin', 'speed_category'])
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
-    )
+    if edges is None or tuple(edges) == default_edges:
+        return default_edges, default_labels
+    return tuple(edges), category_labels(edges)
 
-    return counts.to_dict(orient='records')
+def wind_rose_counts(df, wind_dir_col, value_col, group_cols, n_bins, edges):
+    """
+    Number of readings per (group_cols, direction_bin, category) as a
+    Series. Counts of separate batches of rows add up (see merge_counts).
+    Null group keys are kept.
+    """
+    binned = pd.DataFrame({col: np.asarray(df[col]) for col in group_cols}, index=df.index)
+    binned['direction_bin'] = bin_wind_direction(df[wind_dir_col].to_numpy(), n_bins)
+    binned['category'] = categorize(df[value_col].to_numpy(), edges)
 
-def get_animated_wind_rose_data(df, data_type="wind"):
+    return binned.groupby(group_cols + ['direction_bin', 'category'], dropna=False).size()
+
+def merge_counts(*counts):
+    """Sum count Series built from separate batches of rows (None = no counts)."""
+    counts = [c for c in counts if c is not None]
+    if not counts:
+        return None
+    merged = counts[0]
+    for more in counts[1:]:
+        merged = merged.add(more, fill_value=0)
+    return merged.astype('int64')
+
+def wind_rose_table(counts, labels):
+    """One row per (group, direction_bin) with a count column per category seen."""
+    table = counts.unstack(fill_value=0)
+    table.columns = [labels[i] for i in table.columns]
+    return table.reset_index()
+
+def count_wind_rose_bins(df, wind_dir_col, value_col, group_cols, n_bins, edges, labels):
     """
-    Prepares wind rose data by region and year for animation.
-    Returns a nested dictionary: { region: { year: [ binned records ] } }
+    Count readings per direction sector and value category. Returns one row per
+    (group_cols, direction_bin) with a count column for each category seen.
     """
-    filtered_df = df.copy()
+    counts = wind_rose_counts(df, wind_dir_col, value_col, group_cols, n_bins, edges)
+    return wind_rose_table(counts, labels)
 
-    # Select wind direction column
-    wind_dir_cols = ['avg_wind_dir', 'WDF1', 'WDF2', 'WDF5', 'WDFG']
-    available_cols = [col for col in wind_dir_cols if col in filtered_df.columns]
-    if not available_cols:
-        return {}
+def _wind_dir_column(df):
+    available_cols = [col for col in WIND_DIR_COLUMNS if col in df.columns]
+    return available_cols[0] if available_cols else None
 
-    wind_dir_col = available_cols[0]
-    filtered_df = filtered_df.dropna(subset=[wind_dir_col, 'avg_wind_speed', 'avg_measurement'])
+def get_wind_rose_counts(df, n_bins=DEFAULT_DIRECTION_BINS, speed_edges=None):
+    """Wind rose counts per state (see wind_rose_counts), or None without a direction column."""
+    wind_dir_col = _wind_dir_column(df)
+    if wind_dir_col is None:
+        return None
 
-    def bin_wind_direction(degrees, n_bins=16):
-        return int(np.floor(degrees % 360 / (360 / n_bins)))
+    filtered_df = df.dropna(subset=[wind_dir_col, 'avg_wind_speed'])
+    edges, _ = resolve_category_spec("wind", speed_edges)
+    return wind_rose_counts(filtered_df, wind_dir_col, 'avg_wind_speed', ['state'], n_bins, edges)
 
-    def categorize_wind_speed(speed):
-        if speed < 10: return 'Light (<10)'
-        elif speed < 20: return 'Moderate (10-20)'
-        elif speed < 30: return 'Strong (20-30)'
-        elif speed < 40: return 'Very Strong (30-40)'
-        else: return 'Extreme (>40)'
+def format_wind_rose(counts, state=None, speed_edges=None):
+    """get_wind_rose_data's records from per-state counts; all rows when state is None."""
+    if counts is None:
+        return []
+    if state:
+        states = counts.index.get_level_values('state')
+        counts = counts[states == state].droplevel('state')
+    else:
+        counts = counts.groupby(level=['direction_bin', 'category']).sum()
 
-    def categorize_co(co_level):
-        if co_level < 0.1: return 'Very Low (<0.1)'
-        elif co_level < 0.2: return 'Low (0.1-0.2)'
-        elif co_level < 0.3: return 'Moderate (0.2-0.3)'
-        elif co_level < 0.4: return 'High (0.3-0.4)'
-        else: return 'Very High (>0.4)'
+    _, labels = resolve_category_spec("wind", speed_edges)
+    return wind_rose_table(counts, labels).to_dict(orient='records')
 
-    # Prep bins
-    filtered_df['direction_bin'] = filtered_df[wind_dir_col].apply(bin_wind_direction)
+def get_wind_rose_data(df, state=None, n_bins=DEFAULT_DIRECTION_BINS, speed_edges=None):
+    # Optional filtering by state
+    if state:
+        df = df[df['state'] == state]
+    return format_wind_rose(get_wind_rose_counts(df, n_bins, speed_edges), state, speed_edges)
 
-    if data_type == "wind":
-        filtered_df['category'] = filtered_df['avg_wind_speed'].apply(categorize_wind_speed)
-    else:
-        filtered_df['category'] = filtered_df['avg_measurement'].apply(categorize_co)
+def get_animated_wind_rose_counts(df, data_type="wind", n_bins=DEFAULT_DIRECTION_BINS, edges=None):
+    """Wind rose counts per region and year, or None without a direction column."""
+    wind_dir_col = _wind_dir_column(df)
+    if wind_dir_col is None:
+        return None
 
-    grouped = (
-        filtered_df.groupby(['region', 'year', 'direction_bin', 'category'])
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
-    )
+    filtered_df = df.dropna(subset=[wind_dir_col, 'avg_wind_speed', 'avg_measurement'])
+    value_col = 'avg_wind_speed' if data_type == "wind" else 'avg_measurement'
+    edges, _ = resolve_category_spec(data_type, edges)
+    return wind_rose_counts(filtered_df, wind_dir_col, value_col, ['region', 'year'], n_bins, edges)
+
+def format_animated_wind_rose(counts, data_type="wind", edges=None):
+    """get_animated_wind_rose_data's nested dict from per-region/year counts."""
+    if counts is None:
+        return {}
+    _, labels = resolve_category_spec(data_type, edges)
+    grouped = wind_rose_table(counts, labels)
 
     # Nest the data
     animated_data = {}
-    for region in grouped['region'].unique():
-        region_df = grouped[grouped['region'] == region]
-        year_dict = {}
-        for year in region_df['year'].unique():
-            year_df = region_df[region_df['year'] == year].drop(columns=['region', 'year'])
-            year_dict[str(year)] = year_df.to_dict(orient='records')
-        animated_data[region] = year_dict
+    for (region, year), year_df in grouped.groupby(['region', 'year']):
+        year_records = year_df.drop(columns=['region', 'year']).to_dict(orient='records')
+        animated_data.setdefault(region, {})[str(year)] = year_records
 
     return animated_data
 
-def get_animated_co_data(df):
+def get_animated_wind_rose_data(df, data_type="wind", n_bins=DEFAULT_DIRECTION_BINS, edges=None):
+    """
+    Prepares wind rose data by region and year for animation.
+    Returns a nested dictionary: { region: { year: [ binned records ] } }
     """
-    Builds a dict with nested time-granular CO values for each state_code.
+    counts = get_animated_wind_rose_counts(df, data_type, n_bins, edges)
+    return format_animated_wind_rose(counts, data_type, edges)
+
+# ---------- Map Aggregations ----------
+
+def get_animated_co_data(cube):
+    """
+    Builds a dict with nested time-granular CO values for each state_code,
+    rolled up from the aggregate cube (daily rows are accepted too, see
+    as_cube). Missing readings are left out of the averages, and rows
+    without a state code are left out altogether.
     {
       "CA": {
         "state_code": "CA",
@@ -353,185 +1435,214 @@ def get_animated_co_data(df):
       ...
     }
     """
+    cube = as_cube(cube)
+    by_year = rollup_cube(cube, ["state_code", "year"])
+    by_year["key"] = by_year["year"].astype(str)
+
+    by_month = rollup_cube(cube, ["state_code", "year", "month"])
+    by_month["key"] = (
+        by_month["year"].astype(str) + "-" + by_month["month"].astype(str).str.zfill(2)
+    )
+
+    by_season = rollup_cube(cube, ["state_code", "year", "season"])
+    by_season["key"] = by_season["year"].astype(str) + "-" + by_season["season"]
+
+    states = cube.dropna(subset=["state_code"]).drop_duplicates("state_code")
+
     output = {}
+    for code, name, fips in zip(states["state_code"], states["state"], states["state_fips"]):
+        output[code] = {
+            "state_code": code,
+            "state": name,
+            "state_fips": fips,
+            "year": {},
+            "month": {},
+            "season": {}
+        }
 
-    for _, row in df.iterrows():
-        code = row["state_code"]
-        name = row["state"]
-        fips = row["state_fips"]
-        date = row["date_local"]
-        year = date.year
-        month = date.month
-        season = assign_season(month)
-
-        if code not in output:
-            output[code] = {
-                "state_code": code,
-                "state": name,
-                "state_fips": fips,
-                "year": {},
-                "month": {},
-                "season": {}
-            }
-
-        # Build time keys
-        year_key = str(year)
-        month_key = f"{year}-{month:02d}"
-        season_key = f"{year}-{season}"
-
-        # Append values
-        output[code]["year"].setdefault(year_key, []).append(row["avg_measurement"])
-        output[code]["month"].setdefault(month_key, []).append(row["avg_measurement"])
-        output[code]["season"].setdefault(season_key, []).append(row["avg_measurement"])
-
-    # Collapse lists to averages
-    for state in output:
-        for period_type in ["year", "month", "season"]:
-            for key, values in output[state][period_type].items():
-                if values:
-                    output[state][period_type][key] = round(sum(values) / len(values), 3)
-                else:
-                    output[state][period_type][key] = None
+    for period_type, rolled in [("year", by_year), ("month", by_month), ("season", by_season)]:
+        for code, key, value in zip(rolled["state_code"], rolled["key"], rolled["avg_measurement"]):
+            output[code][period_type][key] = None if pd.isna(value) else round(value, 3)
 
     return output
 
-def get_wind_vectors_static(df):
+# Wind vectors per state at each granularity, as the cube dimensions to
+# roll up over
+WIND_VECTOR_GRANULARITIES = {
+    "all": [],
+    "year": ["year"],
+    "season": ["season"],
+    "month": ["year", "month"],
+    "year_season": ["year", "season"],
+}
+WIND_VECTOR_FIELDS = ["state", "state_code", "state_fips", "wind_direction", "wind_speed", "vector_speed"]
+
+def get_wind_vectors(cube, granularity="all"):
+    """
+    Wind vectors per state and period, rolled up from the cube's u/v sums:
+    wind_direction is the vector (circular) mean direction in degrees,
+    wind_speed the mean speed and vector_speed the length of the mean
+    vector. Period columns are those of WIND_VECTOR_GRANULARITIES[granularity].
+    Like the get_wind_vectors_* helpers built on it, it also takes daily
+    rows instead of the cube (see as_cube).
+    """
+    periods = WIND_VECTOR_GRANULARITIES[granularity]
+    keys = periods + ["state_code", "state", "state_fips"]
+    rolled = rollup_cube(as_cube(cube), keys)
+
+    count = rolled["uv_n"].where(rolled["uv_n"] > 0)
+    u, v = rolled["uv_sum_u"] / count, rolled["uv_sum_v"] / count
+    vectors = rolled[keys].copy()
+    vectors["wind_direction"] = np.degrees(np.arctan2(u, v)).mod(360).where((u != 0) | (v != 0))
+    vectors["wind_speed"] = rolled["avg_wind_speed"]
+    vectors["vector_speed"] = np.hypot(u, v)
+    vectors["state_fips"] = vectors["state_fips"].astype(str)
+    return vectors[periods + WIND_VECTOR_FIELDS]
+
+def wind_vector_period(vectors, granularity):
+    """Each row's period as a string key: "2014", "Winter", "2014-01" or "2014-Winter"."""
+    if granularity == "all":
+        return pd.Series("all", index=vectors.index)
+    if granularity == "season":
+        return vectors["season"].astype(str)
+    year = vectors["year"].astype(str)
+    if granularity == "month":
+        return year + "-" + vectors["month"].astype(str).str.zfill(2)
+    if granularity == "year_season":
+        return year + "-" + vectors["season"].astype(str)
+    return year
+
+def get_wind_vectors_static(cube):
     """
     Returns a DataFrame with average wind direction and speed by state,
     including state_code, state, and state_fips.
     """
-    vectors = (
-        df.groupby(['state_code', 'state', 'state_fips'])
-        .agg({
-            'avg_wind_dir': 'mean',
-            'avg_wind_speed': 'mean'
-        })
-        .reset_index()
-        .rename(columns={
-            'avg_wind_dir': 'wind_direction',
-            'avg_wind_speed': 'wind_speed'
-        })
-    )
+    return get_wind_vectors(cube, "all")
 
-    vectors['state_fips'] = vectors['state_fips'].astype(str)
+def get_wind_vectors_by_period(cube, granularity="year"):
+    """
+    Wind vectors per state for each period (for the animated map).
+    Returns a dict of per-period frames: { "2014": DataFrame, "2015": ... }
+    """
+    vectors = get_wind_vectors(cube, granularity)
+    periods = wind_vector_period(vectors, granularity)
+    return {period: rows[WIND_VECTOR_FIELDS] for period, rows in vectors.groupby(periods, sort=False)}
 
-    return vectors
+def get_wind_vectors_by_year(cube):
+    return get_wind_vectors_by_period(cube, "year")
 
-def get_wind_vectors_by_year(df):
+def get_wind_vectors_by_season(cube, granularity="year_season"):
     """
-    Average wind vectors by state and year (for animated choropleth).
-    Returns a dict: { "2014": [ ... ], "2015": [ ... ], ... }
+    Returns a nested dict: {year: {season: {state_code: {wind data dict}}}},
+    or {season: {state_code: {...}}} with granularity="season". Each entry
+    includes wind_direction, wind_speed, vector_speed and state metadata.
     """
-    df = df.copy()
-    df["year"] = df["date_local"].dt.year 
-    
-    grouped = (
-        df.groupby(['year', 'state_code', 'state', 'state_fips'])
-        .agg({
-            'avg_wind_dir': 'mean',
-            'avg_wind_speed': 'mean'
-        })
-        .reset_index()
-        .rename(columns={
-            'avg_wind_dir': 'wind_direction',
-            'avg_wind_speed': 'wind_speed'
-        })
-    )
-    grouped['state_fips'] = grouped['state_fips'].astype(str)
-
-    vectors_year = {}
-    for _, row in grouped.iterrows():
-        year = str(row['year'])
-        if year not in vectors_year:
-            vectors_year[year] = []
-        vectors_year[year].append({
-            'state': row['state'],
-            'state_code': row['state_code'],
-            'state_fips': row['state_fips'],
-            'wind_direction': row['wind_direction'],
-            'wind_speed': row['wind_speed']
-        })
+    vectors = get_wind_vectors(cube, granularity)
+    vectors = vectors.astype(object).where(vectors.notna(), None)
 
-    return vectors_year
+    grouped = defaultdict(lambda: defaultdict(dict))
+    for record in vectors.to_dict(orient="records"):
+        state_code = record["state_code"] or record["state_fips"]
+        if granularity == "season":
+            grouped[record["season"]][state_code] = record
+        else:
+            grouped[str(record["year"])][record["season"]][state_code] = record
 
+    return grouped
+
+# ---------- Statistical Analysis ----------
 
-def get_wind_vectors_by_season(df):
+PAIR_SUM_COLUMNS = [
+    "pair_n", "pair_sum_co", "pair_sum_wind", "pair_sumsq_co", "pair_sumsq_wind", "pair_sum_co_wind"
+]
+
+def pearson_from_sums(n, sx, sy, sxx, syy, sxy, confidence=0.95):
     """
-    Returns a nested dict: {year: {season: {state_code: {wind data dict}}}}
-    Each entry includes wind_direction, wind_speed, and state metadata.
+    Pearson r for many groups at once from each group's count and sums of
+    x, y, x², y² and xy. Returns a DataFrame of n, r, p_value (two-sided,
+    as scipy.stats.pearsonr) and the Fisher-z confidence interval
+    ci_low/ci_high. r is NaN for groups with fewer than two points or no
+    variance; the interval needs at least four points.
     """
-    df = df.copy()
-    df["year"] = df["date_local"].dt.year
-    df["season"] = df["date_local"].dt.month.apply(assign_season)
+    from scipy import special  # deferred: scipy costs ~1s at import
 
-    vectors_seasons = (
-        df.groupby(["state_code", "state", "state_fips", "year", "season"])
-        .agg({
-            "avg_wind_dir": "mean",
-            "avg_wind_speed": "mean"
-        })
-        .reset_index()
-        .rename(columns={
-            "avg_wind_dir": "wind_direction",
-            "avg_wind_speed": "wind_speed"
-        })
-    )
+    n, sx, sy, sxx, syy, sxy = (np.asarray(v, dtype=float) for v in (n, sx, sy, sxx, syy, sxy))
+    var_x = n * sxx - sx ** 2
+    var_y = n * syy - sy ** 2
+    eps = 8 * np.finfo(float).eps
 
-    vectors_seasons["state_fips"] = vectors_seasons["state_fips"].astype(str)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valid = (n >= 2) & (var_x > eps * n * sxx) & (var_y > eps * n * syy)
+        r = np.where(valid, np.clip((n * sxy - sx * sy) / np.sqrt(var_x * var_y), -1.0, 1.0), np.nan)
 
-    # Reshape into nested dict: year → season → state_code → windData
-    grouped = defaultdict(lambda: defaultdict(dict))
-    for _, row in vectors_seasons.iterrows():
-        year = str(row["year"])
-        season = row["season"]
-        state_code = row["state_code"] or row["state_fips"]
-        grouped[year][season][state_code] = {
-            "state": row["state"],
-            "state_code": row["state_code"],
-            "state_fips": row["state_fips"],
-            "year": row["year"],
-            "season": row["season"],
-            "wind_direction": row["wind_direction"],
-            "wind_speed": row["wind_speed"]
-        }
+        dof = n - 2
+        t = np.abs(r) * np.sqrt(dof / (1.0 - r ** 2))
+        p_value = np.where(dof > 0, 2 * special.stdtr(dof, -t), 1.0)
+        p_value = np.where(np.isnan(r), np.nan, p_value)
 
-    return grouped
+        z = np.arctanh(r)
+        margin = special.ndtri(0.5 + confidence / 2) / np.sqrt(n - 3)
+        ci_low = np.where(n > 3, np.tanh(z - margin), np.nan)
+        ci_high = np.where(n > 3, np.tanh(z + margin), np.nan)
 
-# ---------- Statistical Analysis ----------
+    return pd.DataFrame({
+        "n": n.astype("int64"), "r": r, "p_value": p_value, "ci_low": ci_low, "ci_high": ci_high
+    })
 
-def calculate_correlation(df, group_by_cols):
-    results = []
-    grouped = df.dropna(subset=['avg_measurement', 'avg_wind_speed']).groupby(group_by_cols)
-    
-    for name, group in grouped:
-        if len(group) > 1:
-            x = group['avg_measurement']
-            y = group['avg_wind_speed']
-
-            # Debug print
-            print(f"[DEBUG] group: {name}")
-            if isinstance(x, pd.Series):
-                print(f"[DEBUG] x dtype: {x.dtype}, head:\n{x.head()}")
-            else:
-                print(f"[DEBUG] x type: {type(x)}, columns: {x.columns.tolist()}")
-            if isinstance(y, pd.Series):
-                print(f"[DEBUG] y dtype: {y.dtype}, head:\n{y.head()}")
-            else:
-                print(f"[DEBUG] y type: {type(y)}, columns: {y.columns.tolist()}")
+def pair_sums(df, group_by_cols, x="avg_measurement", y="avg_wind_speed"):
+    """
+    Per-group pair_* sums (the cube's correlation statistics) of the rows
+    where both x and y are present, in one groupby pass. Values are
+    centred on their overall means first, which leaves r unchanged and
+    keeps the sums well conditioned.
+    """
+    paired = df[[*group_by_cols, x, y]].dropna(subset=[x, y])
+    xv = paired[x].astype(float)
+    yv = paired[y].astype(float)
+    xv, yv = xv - xv.mean(), yv - yv.mean()
+
+    sums = paired[group_by_cols].assign(
+        pair_n=1,
+        pair_sum_co=xv,
+        pair_sum_wind=yv,
+        pair_sumsq_co=xv ** 2,
+        pair_sumsq_wind=yv ** 2,
+        pair_sum_co_wind=xv * yv,
+    )
+    return sums.groupby(group_by_cols, observed=True).sum().reset_index()
 
-            try:
-                corr, p_val = stats.pearsonr(x.astype(float), y.astype(float))
-                print(f"[DEBUG] corr: {corr}, p_val raw: {p_val} (type: {type(p_val)})")
-                p_val = float(p_val)
-            except Exception as e:
-                print(f"[ERROR] Pearson failed for group: {name} — {e}")
-                continue
+def correlation_table(sums, group_by_cols, confidence=0.95, alpha=0.05):
+    """
+    Correlation, P-value and Significance per group (plus n and the
+    confidence interval) from a frame of pair_* sums.
+    """
+    stats = pearson_from_sums(*(sums[col].to_numpy() for col in PAIR_SUM_COLUMNS), confidence=confidence)
+    table = sums[group_by_cols].reset_index(drop=True)
+    table["Correlation"] = stats["r"]
+    table["P-value"] = stats["p_value"]
+    table["Significance"] = np.where(stats["p_value"] < alpha, "significant", "not significant")
+    table["n"] = stats["n"]
+    table["ci_low"] = stats["ci_low"]
+    table["ci_high"] = stats["ci_high"]
+    return table
 
-            sig = "significant" if p_val < 0.05 else "not significant"
-            name_parts = name if isinstance(name, tuple) else (name,)
-            results.append((*name_parts, corr, p_val, sig))
-    
-    return pd.DataFrame(results, columns=[*group_by_cols, 'Correlation', 'P-value', 'Significance'])
+def calculate_correlation(df, group_by_cols):
+    """CO vs wind speed correlation per group of df's rows (groups of two or more)."""
+    sums = pair_sums(df, group_by_cols)
+    table = correlation_table(sums[sums["pair_n"] > 1], group_by_cols)
+    metrics.EVENTS.inc(len(table), event="correlation_group_computed")
+    return table
+
+def cube_correlation(cube, group_by_cols):
+    """calculate_correlation over the daily rows, from the aggregate cube's pair sums."""
+    sums = rollup_cube(cube, group_by_cols)
+    table = correlation_table(sums[sums["pair_n"] > 1], group_by_cols)
+    metrics.EVENTS.inc(len(table), event="correlation_group_computed")
+    return table
+
+def unix_seconds(dates):
+    """Datetimes as integer UNIX seconds, whatever resolution they are stored in."""
+    return dates.astype("datetime64[s]").astype("int64")
 
 def calculate_trend_line(df, date_col, value_col):
     df = df.copy()
@@ -549,7 +1660,9 @@ def calculate_trend_line(df, date_col, value_col):
             "std_err": None
         }
 
-    df["timestamp"] = df[date_col].astype("int64") // 10**9  # convert to UNIX seconds
+    from scipy.stats import linregress  # deferred: scipy.stats costs ~1s at import
+
+    df["timestamp"] = unix_seconds(df[date_col])
     slope, intercept, r_value, p_value, std_err = linregress(df["timestamp"], df[value_col])
 
     return {
@@ -560,23 +1673,240 @@ def calculate_trend_line(df, date_col, value_col):
         "std_err": float(std_err)
     }
     
-def compute_raw_state_correlations(df):
-    df = df.dropna(subset=['avg_measurement', 'avg_wind_speed'])
-    grouped = df.groupby('state')
-    
-    records = []
-    for state, group in grouped:
-        corr = group['avg_measurement'].corr(group['avg_wind_speed'])
-        records.append({
-            'state': state,
-            'Correlation': round(corr, 6) if pd.notnull(corr) else None
-        })
-    
-    result = pd.DataFrame(records)
+def trend_lines(monthly):
+    """CO and wind trend lines of a monthly frame's rolling averages."""
+    return {
+        "co": calculate_trend_line(monthly, "date", "rolling_avg_co"),
+        "wind": calculate_trend_line(monthly, "date", "rolling_avg_wind")
+    }
+
+TREND_FIELDS = ["slope", "intercept", "r_value", "p_value", "std_err"]
+
+def grouped_linregress(df, by, x, y):
+    """
+    Least-squares fit of y on x for every group at once, with the fields
+    of calculate_trend_line. Datetime x is regressed in UNIX seconds. Sums
+    are taken about each group's means (two vectorized passes) so large x
+    values such as timestamps don't cancel out.
+    """
+    data = df[[*by, x, y]].dropna(subset=[x, y])
+    xv = data[x]
+    if pd.api.types.is_datetime64_any_dtype(xv):
+        xv = unix_seconds(xv)
+    data = data[by].assign(_x=xv.astype(float), _y=data[y].astype(float))
+
+    means = data.groupby(by, observed=True)[["_x", "_y"]].transform("mean")
+    dx = data["_x"] - means["_x"]
+    dy = data["_y"] - means["_y"]
+    sums = (
+        data.assign(_n=1, _xx=dx ** 2, _yy=dy ** 2, _xy=dx * dy)
+        .groupby(by, observed=True)[["_n", "_x", "_y", "_xx", "_yy", "_xy"]].sum()
+        .reset_index()
+    )
+
+    n = sums["_n"].to_numpy(dtype=float)
+    sxx, syy, sxy = (sums[col].to_numpy() for col in ["_xx", "_yy", "_xy"])
+    zeros = np.zeros(len(sums))
+    stats = pearson_from_sums(n, zeros, zeros, sxx, syy, sxy)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        intercept = sums["_y"].to_numpy() / n - slope * sums["_x"].to_numpy() / n
+        std_err = np.where(n > 2, np.sqrt((1 - stats["r"] ** 2) * syy / sxx / (n - 2)), 0.0)
+
+    fits = sums[by].copy()
+    fits["slope"] = slope
+    fits["intercept"] = intercept
+    fits["r_value"] = stats["r"].to_numpy()
+    fits["p_value"] = stats["p_value"].to_numpy()
+    fits["std_err"] = np.where(np.isnan(slope), np.nan, std_err)
+    return fits
+
+def get_state_trends(state_monthly):
+    """
+    Trend lines of the rolling CO and wind averages for every state, from
+    get_all_state_monthly_averages: {state: {"co": {...}, "wind": {...}}}
+    with calculate_trend_line's fields.
+    """
+    trends = {state: {} for state in state_monthly["state"].unique()}
+    for key, column in [("co", "rolling_avg_co"), ("wind", "rolling_avg_wind")]:
+        fits = grouped_linregress(state_monthly, ["state"], "date", column)
+        fits = fits.set_index("state")[TREND_FIELDS].astype(object)
+        for state, row in fits.where(fits.notna(), None).iterrows():
+            trends[state][key] = row.to_dict()
+    empty = dict.fromkeys(TREND_FIELDS)
+    for trend in trends.values():
+        trend.setdefault("co", empty)
+        trend.setdefault("wind", empty)
+    return trends
+
+QUERY_DIMENSIONS = ["state", "region", "year", "season", "month"]
+SEASONS = ["Winter", "Spring", "Summer", "Fall"]
+
+def query_cube(cube, states=None, years=None, seasons=None, group_by=()):
+    """
+    Aggregates of the daily rows in a slice of the data: the given states,
+    inclusive (first, last) year range and seasons, each optional. Returns
+    one row per group_by group (one row overall without it) with n_rows,
+    the mean and sample std of CO and wind speed, and their correlation,
+    all rolled up from the cube's sums.
+    """
+    mask = np.ones(len(cube), dtype=bool)
+    if states is not None:
+        mask &= cube["state"].isin(states).to_numpy()
+    if years is not None:
+        mask &= cube["year"].between(*years).to_numpy()
+    if seasons is not None:
+        mask &= cube["season"].isin(seasons).to_numpy()
+
+    by = list(group_by) or ["_all"]
+    rolled = rollup_cube(cube[mask].assign(_all=0), by)
+    if rolled.empty and not group_by:
+        rolled = pd.DataFrame(0, index=[0], columns=["_all"] + _cube_stat_columns(cube))
+
+    result = rolled[list(group_by)].copy()
+    result["n_rows"] = rolled["n_rows"].astype("int64")
+    for col, name in [("avg_measurement", "co"), ("avg_wind_speed", "wind")]:
+        n = rolled[f"{col}_n"].where(rolled[f"{col}_n"] > 0)
+        mean = rolled[f"{col}_sum"] / n
+        variance = (rolled[f"{col}_sumsq"] - n * mean ** 2) / (n - 1).where(n > 1)
+        result[f"avg_{name}"] = mean
+        result[f"std_{name}"] = np.sqrt(variance.clip(lower=0))
+    stats = pearson_from_sums(*(rolled[col].to_numpy(dtype=float) for col in PAIR_SUM_COLUMNS))
+    result["correlation"] = stats["r"]
+    result["p_value"] = stats["p_value"]
+    return result.reset_index(drop=True)
+
+def compute_raw_state_correlations(cube):
+    """
+    Per-state correlation of daily CO vs wind speed, with real p-values,
+    from the aggregate cube (or daily rows, see as_cube).
+    """
+    sums = rollup_cube(as_cube(cube), ['state'])
+    result = correlation_table(sums[sums['pair_n'] > 0], ['state'])
+    result['Correlation'] = result['Correlation'].round(6)
+
     result['state_code'] = result['state'].map(state_name_to_code)
     result['state_fips'] = result['state_code'].map(state_code_to_fips)
-    result['Significance'] = 'significant'  # your teammate didn't calculate p-values
-    return result
+    return result[['state', 'Correlation', 'state_code', 'state_fips', 'Significance',
+                   'P-value', 'n', 'ci_low', 'ci_high']]
+
+# ---------- Distribution Sketches ----------
+
+DISTRIBUTION_MEASURES = {"co": "avg_measurement", "wind": "avg_wind_speed"}
+
+# Quantile sketch: log-spaced bins (as in DDSketch), so every quantile is
+# estimated within SKETCH_ACCURACY relative error whatever the range.
+# Values below SKETCH_MIN_VALUE, zero and negatives included, share the
+# lowest bin.
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+SKETCH_MIN_VALUE = 1e-3
+
+# Fixed-width histogram bins; bin -1 counts values below the first edge
+# and bin len(edges) - 1 values from the last edge up
+HISTOGRAM_EDGES = {
+    "co": np.round(np.arange(0, 5.0001, 0.1), 6),
+    "wind": np.arange(0, 41, 1.0),
+}
+
+def sketch_bin(values):
+    return np.ceil(np.log(np.maximum(values, SKETCH_MIN_VALUE)) / np.log(SKETCH_GAMMA)).astype("int64")
+
+def sketch_value(bins):
+    """The value a sketch bin stands for: within SKETCH_ACCURACY of all its values."""
+    return 2 * SKETCH_GAMMA ** np.asarray(bins, dtype=float) / (SKETCH_GAMMA + 1)
+
+def distribution_counts(df):
+    """
+    Mergeable distributions of each DISTRIBUTION_MEASURES column per
+    state × year × month: readings per (measure, kind, state, year, month,
+    bin) as a Series, where kind is "sketch" (quantile sketch bins) or
+    "histogram" (HISTOGRAM_EDGES bins). Counts of separate batches of rows
+    add up (see merge_counts).
+    """
+    keys = {col: np.asarray(df[col]) for col in CUBE_KEYS}
+    parts = []
+    for measure, col in DISTRIBUTION_MEASURES.items():
+        values = df[col].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        edges = HISTOGRAM_EDGES[measure]
+        bins = {
+            "sketch": sketch_bin(values[valid]),
+            "histogram": np.searchsorted(edges, values[valid], side="right") - 1,
+        }
+        for kind, binned in bins.items():
+            frame = pd.DataFrame({col: keys[col][valid] for col in CUBE_KEYS})
+            frame["measure"], frame["kind"], frame["bin"] = measure, kind, binned
+            parts.append(frame.groupby(["measure", "kind"] + CUBE_KEYS + ["bin"], dropna=False).size())
+    return pd.concat(parts)
+
+def distribution_summary(counts, measure, states=None, years=None, seasons=None, group_by=(),
+                         quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """
+    Quantiles and histogram of `measure` ("co" or "wind") over a slice of
+    the data (states, inclusive year range, seasons; as query_cube), per
+    group_by group, from distribution_counts alone. One dict per group
+    with n, the quantile estimates, the histogram counts per
+    HISTOGRAM_EDGES bin, and underflow/overflow counts.
+    """
+    group_by = list(group_by)
+    edges = HISTOGRAM_EDGES[measure]
+    if counts is None:
+        return []
+    counts = counts.loc[measure].rename("count").reset_index()
+
+    mask = np.ones(len(counts), dtype=bool)
+    if states is not None:
+        mask &= counts["state"].isin(states).to_numpy()
+    if years is not None:
+        mask &= counts["year"].between(*years).to_numpy()
+    if seasons is not None:
+        months = [month for month in range(1, 13) if assign_season(month) in seasons]
+        mask &= counts["month"].isin(months).to_numpy()
+    counts = counts[mask]
+    if "season" in group_by:
+        counts = counts.assign(season=counts["month"].map({m: assign_season(m) for m in range(1, 13)}))
+    if "region" in group_by:
+        regions = {state: assign_region(state) for state in counts["state"].unique()}
+        counts = counts.assign(region=counts["state"].map(regions))
+
+    if counts.empty:
+        return []
+
+    by = group_by or ["_all"]
+    counts = counts.assign(_all=0)
+    sketch = counts[counts["kind"] == "sketch"].groupby(by + ["bin"], observed=True)["count"].sum()
+    sizes = sketch.groupby(level=by, sort=False).size()
+    histogram = (
+        counts[counts["kind"] == "histogram"].groupby(by + ["bin"], observed=True)["count"].sum()
+        .unstack("bin", fill_value=0)
+        .reindex(index=sizes.index, columns=range(-1, len(edges)), fill_value=0)
+    )
+
+    # Quantiles of every group at once: the estimate for q is the first bin
+    # whose running count within the group passes rank q * (n - 1)
+    cumulative = np.cumsum(sketch.to_numpy())
+    ends = np.cumsum(sizes.to_numpy())
+    before = np.r_[0, cumulative][ends - sizes.to_numpy()]
+    n = cumulative[ends - 1] - before
+    ranks = before[:, None] + np.outer(n - 1, np.asarray(quantiles, dtype=float))
+    bins = sketch.index.get_level_values("bin").to_numpy()
+    estimates = sketch_value(bins[np.searchsorted(cumulative, ranks, side="right")])
+
+    results = []
+    for key, count, values, hist in zip(sizes.index, n, estimates, histogram.to_numpy()):
+        key = key if isinstance(key, tuple) else (key,)
+        result = {dim: value for dim, value in zip(group_by, key)}
+        result.update({
+            "n": int(count),
+            "quantiles": {f"{q:g}": float(v) for q, v in zip(quantiles, values)},
+            "histogram": hist[1:-1].tolist(),
+            "underflow": int(hist[0]),
+            "overflow": int(hist[-1]),
+        })
+        results.append(result)
+    return results
 
 # ---------- Fetch State Name List ----------
 
@@ -584,20 +1914,571 @@ def get_unique_states(df):
     return sorted(df['state'].dropna().unique())
 
 # ---------- Utilities ----------
+@metrics.timed_stage("serialize")
 def clean_for_json(obj):
+    return _clean_for_json(obj)
+
+def _clean_for_json(obj):
     if isinstance(obj, pd.DataFrame):
         obj = obj.where(pd.notnull(obj), None)
         return [
-            {k: clean_for_json(v) for k, v in row.items()}
+            {k: _clean_for_json(v) for k, v in row.items()}
             for row in obj.to_dict(orient="records")
         ]
     elif isinstance(obj, dict):
-        return {k: clean_for_json(v) for k, v in obj.items()}
+        return {k: _clean_for_json(v) for k, v in obj.items()}
     elif isinstance(obj, list):
-        return [clean_for_json(v) for v in obj]
+        return [_clean_for_json(v) for v in obj]
     elif isinstance(obj, pd.Timestamp):
         return obj.isoformat()
     elif isinstance(obj, float) and pd.isna(obj):
         return None
     return obj
 
+
+# ---------- JSON Serialization ----------
+
+def _json_ready(df, millis=False):
+    # Datetime columns as ISO 8601 strings (what clean_for_json produced, or
+    # with milliseconds as row exports write them); NaT stays null
+    fmt = "%Y-%m-%dT%H:%M:%S.%f" if millis else "%Y-%m-%dT%H:%M:%S"
+    dates = {col: df[col].dt.strftime(fmt) for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])}
+    if millis:
+        dates = {col: text.str[:-3] for col, text in dates.items()}
+    return df.assign(**dates) if dates else df
+
+def _json_values(series):
+    """
+    Each value of a column as JSON text, vectorized per column. Floats are
+    written the way json.dumps writes them (shortest repr that reads back
+    to the same value, float32 at float32 precision); NaN, infinities and
+    missing values become null. Strings and other objects are encoded
+    once per distinct value.
+    """
+    dtype = series.dtype
+    if pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype):
+        values = series.to_numpy()
+        texts = list(map(repr, values.tolist())) if dtype == np.float64 else list(map(str, values))
+        finite = np.isfinite(values)
+        if not finite.all():
+            texts = np.array(texts, dtype=object)
+            texts[~finite] = "null"
+            texts = texts.tolist()
+        return texts
+    if pd.api.types.is_bool_dtype(dtype) and isinstance(dtype, np.dtype):
+        return np.where(series.to_numpy(), "true", "false").tolist()
+    if pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        return list(map(str, series.to_numpy().tolist()))
+    codes, uniques = pd.factorize(series)
+    texts = [json.dumps(value, allow_nan=False, default=_json_default) for value in uniques]
+    return np.array(texts + ["null"], dtype=object)[codes].tolist()  # code -1 (missing) -> null
+
+def _records_text(df, sep=","):
+    # The rows of df as JSON objects, joined by sep
+    if not len(df.columns):
+        return sep.join(["{}"] * len(df))
+    template = "{" + ",".join(json.dumps(str(col)).replace("%", "%%") + ":%s" for col in df.columns) + "}"
+    columns = [_json_values(df[col]) for col in df.columns]
+    return sep.join(map(template.__mod__, zip(*columns)))
+
+def json_column(series):
+    """One column as a JSON array: NaN -> null, datetimes -> ISO 8601."""
+    return "[" + ",".join(_json_values(_json_ready(series.to_frame("value"))["value"])) + "]"
+
+def frame_to_json(df, columnar=False):
+    """
+    Serialize a DataFrame without building a Python dict per row: as
+    records ([{"a": 1, "b": null}, ...]) or, with columnar=True, as one
+    array per field ({"a": [1, ...], "b": [null, ...]}).
+    """
+    if columnar:
+        return "{" + ",".join(
+            f"{json.dumps(str(col))}:{json_column(df[col])}" for col in df.columns
+        ) + "}"
+    return "[" + _records_text(_json_ready(df)) + "]"
+
+class _ContainsFrame(Exception):
+    pass
+
+def _json_default(obj):
+    if isinstance(obj, pd.DataFrame):
+        raise _ContainsFrame
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _json_parts(obj, columnar, out):
+    if isinstance(obj, pd.DataFrame):
+        out.append(frame_to_json(obj, columnar))
+        return
+    # Plain parts go through the C encoder in one call; only containers
+    # holding a DataFrame or a NaN are walked further
+    try:
+        out.append(json.dumps(obj, allow_nan=False, default=_json_default, separators=(",", ":")))
+        return
+    except (_ContainsFrame, ValueError):
+        pass
+
+    if isinstance(obj, dict):
+        out.append("{")
+        for i, (key, value) in enumerate(obj.items()):
+            out.append(("," if i else "") + json.dumps(str(key)) + ":")
+            _json_parts(value, columnar, out)
+        out.append("}")
+    elif isinstance(obj, (list, tuple)):
+        out.append("[")
+        for i, value in enumerate(obj):
+            if i:
+                out.append(",")
+            _json_parts(value, columnar, out)
+        out.append("]")
+    else:
+        out.append("null")  # NaN / infinity
+
+@metrics.timed_stage("serialize")
+def dumps_json(obj, columnar=False):
+    """
+    JSON text for a route payload. DataFrames anywhere in it are written by
+    frame_to_json (records, or arrays per field with columnar=True); the
+    rest matches clean_for_json + jsonify, NaN included as null.
+    """
+    out = []
+    _json_parts(obj, columnar, out)
+    return "".join(out)
+
+
+# ---------- Streaming Export ----------
+
+EXPORT_CHUNK_ROWS = 10_000
+
+# Columns the compact layout leaves out; built from date_local per chunk
+DERIVED_EXPORT_COLUMNS = {
+    "date": lambda dates: dates.dt.strftime("%Y-%m-%d"),
+    "year_month": lambda dates: dates.dt.strftime("%Y-%m"),
+}
+
+def export_columns(df):
+    """Every field a row export can include, stored or derived."""
+    return list(df.columns) + [col for col in DERIVED_EXPORT_COLUMNS if col not in df.columns]
+
+def select_rows(df, state=None, start=None, end=None, index=None):
+    """
+    Positions of the rows matching the optional state and inclusive
+    date_local range. Cheaper than building a filtered copy of the frame;
+    with the frame's RowIndex, binary searches replace the masks.
+    """
+    if index is not None:
+        return index.positions(None if state is None else [state], start, end)
+    mask = np.ones(len(df), dtype=bool)
+    if state is not None:
+        mask &= (df["state"] == state).to_numpy()
+    if start is not None:
+        mask &= (df["date_local"] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (df["date_local"] <= pd.Timestamp(end)).to_numpy()
+    return np.flatnonzero(mask)
+
+def _export_chunk(df, rows, fields):
+    # The requested fields of the rows at positions `rows`, derived columns included
+    derived = [col for col in fields if col not in df.columns]
+    chunk = df.iloc[rows, df.columns.get_indexer([col for col in fields if col in df.columns])]
+    if derived:
+        dates = df["date_local"].iloc[rows]
+        chunk = chunk.assign(**{col: DERIVED_EXPORT_COLUMNS[col](dates) for col in derived})[fields]
+    return chunk
+
+def _export_chunks(df, positions, fields, chunk_rows):
+    # One chunk of rows at a time
+    for offset in range(0, len(positions), chunk_rows):
+        yield _export_chunk(df, positions[offset:offset + chunk_rows], fields)
+
+def iter_json_records(df, positions, fields=None, lines=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Serialize the rows at `positions` a chunk at a time, either as NDJSON
+    (`lines=True`) or as a single JSON array of records. Only the requested
+    fields of one chunk are materialized at any point. NaN becomes null and
+    timestamps are written as ISO 8601.
+    """
+    fields = list(fields) if fields else export_columns(df)
+    return _json_records(_export_chunks(df, positions, fields, chunk_rows), lines)
+
+def iter_json_batches(batches, fields=None, lines=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """iter_json_records over every row of a series of frames (see iter_batches)."""
+    chunks = (
+        chunk
+        for batch in batches
+        for chunk in _export_chunks(batch, np.arange(len(batch)), list(fields or export_columns(batch)),
+                                    chunk_rows)
+    )
+    return _json_records(chunks, lines)
+
+def _json_records(chunks, lines):
+    if not lines:
+        yield "["
+    for i, chunk in enumerate(chunks):
+        body = _records_text(_json_ready(chunk, millis=True), sep="\n" if lines else ",")
+        if lines:
+            yield body + "\n"
+        else:
+            yield ("," if i else "") + body
+    if not lines:
+        yield "]"
+
+def iter_json_columns(df, positions, fields=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Columnar counterpart of iter_json_records: {"field": [values...], ...}.
+    Each field is written in full before the next, one chunk of that
+    field at a time.
+    """
+    fields = list(fields) if fields else export_columns(df)
+
+    yield "{"
+    for i, field in enumerate(fields):
+        yield ("," if i else "") + json.dumps(field) + ":["
+        for j, chunk in enumerate(_export_chunks(df, positions, [field], chunk_rows)):
+            yield ("," if j else "") + json_column(chunk[field])[1:-1]
+        yield "]"
+    yield "}"
+
+
+# ---------- Arrow / Parquet Export ----------
+
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+
+# Written as dictionary arrays: a few dozen distinct strings over every row
+DICTIONARY_COLUMNS = ["state", "region"]
+
+def export_dictionaries(cube):
+    """The dictionary of each DICTIONARY_COLUMNS column, from the aggregate cube's values."""
+    return {col: sorted(cube[col].dropna().unique()) for col in DICTIONARY_COLUMNS if col in cube.columns}
+
+def _arrow_array(values, dictionary=None, type=None):
+    if dictionary is None:
+        array = pa.array(values, type=type, from_pandas=True)
+        # Arrow-backed string columns come back as the chunks they are stored in
+        return array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array
+    # Codes against a fixed dictionary, so every batch of a stream shares it
+    codes = pd.Categorical(values, categories=dictionary).codes.astype(np.int32)
+    return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), pa.array(dictionary, type=pa.string()))
+
+def _arrow_batch(chunk, dictionaries, schema=None):
+    arrays = [
+        _arrow_array(chunk[col], dictionaries.get(col),
+                     None if schema is None or col in dictionaries else schema.field(col).type)
+        for col in chunk.columns
+    ]
+    return pa.RecordBatch.from_arrays(arrays, names=[str(col) for col in chunk.columns])
+
+class _ByteSink:
+    """Write-only file object for the Arrow writers; drain() returns what was written since the last call."""
+
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+def _iter_arrow(chunks, empty, dictionaries, parquet, metadata=None):
+    # Each chunk becomes one record batch (one row group for Parquet) and
+    # its bytes are yielded as soon as they are written. The schema is the
+    # first chunk's, or `empty`'s when there are no rows.
+    if pa is None:
+        raise ImportError("Arrow and Parquet responses require pyarrow")
+    dictionaries = dictionaries or {}
+    sink = _ByteSink()
+
+    def open_writer(batch):
+        schema = batch.schema.with_metadata(metadata) if metadata else batch.schema
+        return schema, pq.ParquetWriter(sink, schema) if parquet else pa.ipc.new_stream(sink, schema)
+
+    schema = writer = None
+    for chunk in chunks:
+        batch = _arrow_batch(chunk, dictionaries, schema)
+        if writer is None:
+            schema, writer = open_writer(batch)
+        writer.write_batch(batch)
+        yield sink.drain()
+    if writer is None:
+        _, writer = open_writer(_arrow_batch(empty, dictionaries))
+    writer.close()
+    yield sink.drain()
+
+def iter_arrow_records(df, positions, fields=None, dictionaries=None, parquet=False,
+                       chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Binary counterpart of iter_json_records: the rows at `positions` as an
+    Arrow IPC stream (or a Parquet file with parquet=True), one record
+    batch per chunk. Columns go from the frame straight to Arrow arrays;
+    the columns in `dictionaries` ({column: values}, see
+    export_dictionaries) are dictionary encoded.
+    """
+    fields = list(fields) if fields else export_columns(df)
+    return _iter_arrow(_export_chunks(df, positions, fields, chunk_rows),
+                       _export_chunk(df, positions[:0], fields), dictionaries, parquet)
+
+def iter_arrow_batches(batches, empty, fields=None, dictionaries=None, parquet=False,
+                       chunk_rows=EXPORT_CHUNK_ROWS):
+    """iter_arrow_records over every row of a series of frames shaped like `empty` (see iter_batches)."""
+    fields = list(fields) if fields else export_columns(empty)
+    chunks = (
+        chunk
+        for batch in batches
+        for chunk in _export_chunks(batch, np.arange(len(batch)), fields, chunk_rows)
+    )
+    return _iter_arrow(chunks, _export_chunk(empty, np.arange(0), fields), dictionaries, parquet)
+
+def frame_to_arrow(df, dictionaries=None, parquet=False, metadata=None):
+    """
+    One frame as Arrow IPC stream (or Parquet) bytes. `metadata` values
+    are stored JSON-encoded in the schema metadata.
+    """
+    metadata = {key: json.dumps(clean_for_json(value)) for key, value in (metadata or {}).items()}
+    return b"".join(_iter_arrow([df], df.iloc[:0], dictionaries, parquet, metadata))
+
+
+# ---------- Downsampling ----------
+
+# Series kept shape-true by downsample_rows; each bucket keeps the rows with
+# the minimum and maximum of each
+DOWNSAMPLE_COLUMNS = ["avg_measurement", "avg_wind_speed"]
+
+def downsample_rows(df, positions, buckets, columns=DOWNSAMPLE_COLUMNS):
+    """
+    Min/max decimation of each state's daily series. The rows at
+    `positions` (in state, date order) are split per state into `buckets`
+    runs of equal length; each run keeps only the rows holding the minimum
+    and maximum of every column, so peaks and troughs survive, plus each
+    state's first and last row. States with at most 2 * len(columns) *
+    buckets rows are kept whole. Returns the kept positions, in order.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if len(positions) == 0:
+        return positions
+
+    codes = pd.factorize(df["state"].iloc[positions])[0]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    lengths = np.diff(np.r_[starts, len(codes)])
+    size = np.repeat(lengths, lengths)
+    rank = np.arange(len(codes)) - np.repeat(starts, lengths)
+    key = np.repeat(np.arange(len(starts)), lengths) * buckets + rank * buckets // size
+
+    keep = size <= 2 * len(columns) * buckets
+    keep[starts] = keep[starts + lengths - 1] = True
+    for col in columns:
+        values = df[col].to_numpy(dtype=float)[positions]
+        valid = np.flatnonzero(~np.isnan(values))
+        order = valid[np.lexsort((values[valid], key[valid]))]
+        change = np.flatnonzero(np.diff(key[order])) + 1
+        keep[order[np.r_[0, change]]] = True       # minimum of each bucket
+        keep[order[np.r_[change - 1, -1]]] = True  # maximum of each bucket
+    return positions[keep]
+
+def pyramid_buckets(max_points, window_rows, total_rows, columns=DOWNSAMPLE_COLUMNS):
+    """
+    Buckets per state of the pyramid level to serve a window of
+    `window_rows` out of `total_rows` with about `max_points` rows per
+    state: the largest power of two that stays within the budget.
+    """
+    target = max_points * total_rows / (2 * len(columns) * max(window_rows, 1))
+    return 1 << max(int(np.log2(max(target, 1))), 0)
+
+# Finest pyramid level kept; windows needing more detail are decimated directly
+MAX_PYRAMID_BUCKETS = 1 << 14
+
+def pyramid_level(df, buckets, columns=DOWNSAMPLE_COLUMNS):
+    """One pyramid level: downsample_rows over the whole frame."""
+    return downsample_rows(df, np.arange(len(df)), buckets, columns)
+
+def within(level, positions):
+    """The sorted positions of a pyramid level that also appear in sorted `positions`."""
+    found = np.searchsorted(positions, level)
+    hit = found < len(positions)
+    hit[hit] = positions[found[hit]] == level[hit]
+    return level[hit]
+
+
+# ---------- Per-State Payloads ----------
+
+# Response bodies of the per-state POST routes with default options, built
+# for every state in parallel and stored per dataset version:
+# STATE_PAYLOAD_DIR/<version>/<route>/<state>.json
+STATE_PAYLOAD_DIR = DATA_DIR / "state_payloads"
+STATE_PAYLOAD_ROUTES = ("state_comparison", "state_data", "wind_rose")
+
+# What the build workers serialize from; set before the pool forks so each
+# worker shares the parent's copy instead of unpickling its own
+_payload_source = {}
+
+def state_payload_path(version: str, route: str, state: str,
+                       payload_dir: Path = STATE_PAYLOAD_DIR) -> Path | None:
+    """Where a state's payload is stored; None for names that aren't states."""
+    if route not in STATE_PAYLOAD_ROUTES or state not in state_name_to_code:
+        return None
+    return _payload_file(payload_dir / version, route, state)
+
+def _payload_file(root: Path, route: str, state: str) -> Path:
+    return root / route / f"{state.replace(' ', '_')}.json"
+
+def has_state_payloads(version: str, payload_dir: Path = STATE_PAYLOAD_DIR) -> bool:
+    return (payload_dir / version / "timings.json").exists()
+
+def _write_state_payloads(state):
+    # One state's bodies, as /state_comparison, /state_data and /wind_rose return them
+    started = time.perf_counter()
+    source = _payload_source
+    df, monthly = source["df"], source["state_monthly"][state]
+    bodies = {
+        "state_comparison": dumps_json({
+            "state": state,
+            "state_monthly": monthly,
+            "state_trend": source["state_trends"][state],
+            "us_monthly": source["us_monthly"],
+            "us_trend": source["us_trend"],
+        }),
+        "state_data": "".join(iter_json_records(df, select_rows(df, state=state))),
+        "wind_rose": dumps_json(format_wind_rose(source["wind_rose_counts"], state)),
+    }
+    size = 0
+    for route, body in bodies.items():
+        path = _payload_file(source["out_dir"], route, state)
+        path.write_text(body, encoding="utf-8")
+        size += path.stat().st_size
+    return state, time.perf_counter() - started, size
+
+def build_state_payloads(dataset, payload_dir: Path = STATE_PAYLOAD_DIR,
+                         processes: int | None = None) -> pd.DataFrame:
+    """
+    Write every state's payloads for `dataset` under payload_dir/<version>,
+    one state per task on a fork-based process pool (`processes` defaults to
+    the CPU count). Forking is only safe from a single-threaded process such
+    as the `payloads` CLI; callers inside the server pass processes=1, which
+    writes the states one by one on the calling thread. Returns the
+    per-state timings, which are also saved as timings.json; older
+    versions' payloads are removed. Needs the rows in memory, so raises
+    ValueError for an out-of-core dataset.
+    """
+    import multiprocessing
+
+    if dataset.out_of_core:
+        raise ValueError("State payloads are built from the rows in memory; not available out of core")
+    started = time.perf_counter()
+    df, cube = dataset.df, dataset.cube
+    states = [state for state in get_unique_states(df) if state in state_name_to_code]
+    all_state_monthly = get_all_state_monthly_averages(cube)
+    us_monthly = get_cube_monthly_averages(cube)
+
+    staging = payload_dir / f".{dataset.version}.{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    for route in STATE_PAYLOAD_ROUTES:
+        (staging / route).mkdir(parents=True)
+
+    _payload_source.update(
+        df=df,
+        state_monthly=split_by_state(all_state_monthly),
+        state_trends=get_state_trends(all_state_monthly),
+        us_monthly=us_monthly,
+        us_trend=trend_lines(us_monthly),
+        wind_rose_counts=get_wind_rose_counts(df),
+        out_dir=staging,
+    )
+    processes = min(processes or os.cpu_count() or 1, len(states) or 1)
+    try:
+        if processes > 1 and "fork" in multiprocessing.get_all_start_methods():
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                results = list(pool.imap_unordered(_write_state_payloads, states))
+        else:
+            results = [_write_state_payloads(state) for state in states]
+    finally:
+        _payload_source.clear()
+
+    timings = pd.DataFrame(results, columns=["state", "seconds", "bytes"]).sort_values(
+        "seconds", ascending=False, ignore_index=True)
+    (staging / "timings.json").write_text(json.dumps({
+        "processes": processes,
+        "wall_seconds": time.perf_counter() - started,
+        "states": timings.to_dict(orient="records"),
+    }, indent=2))
+
+    # Published in one rename; a build that lost the race to another
+    # process leaves the existing copy in place
+    target = payload_dir / dataset.version
+    try:
+        os.replace(staging, target)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+    for old in payload_dir.iterdir():
+        if old.is_dir() and old.name != dataset.version and not old.name.startswith("."):
+            shutil.rmtree(old, ignore_errors=True)
+    return timings
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Dataset build steps for the CO dashboard.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = commands.add_parser("snapshot", help="write the startup snapshot workers boot from")
+    snapshot.add_argument("--compact", action="store_true", help="use the compact layout")
+    snapshot.add_argument("--out", type=Path, default=SNAPSHOT_DIR)
+
+    commands.add_parser("memory-report", help="compare standard vs compact memory use")
+
+    payloads = commands.add_parser("payloads", help="prebuild the per-state route payloads")
+    payloads.add_argument("--processes", type=int, help="worker processes (default: CPU count)")
+    payloads.add_argument("--out", type=Path, default=STATE_PAYLOAD_DIR)
+
+    append = commands.add_parser("append", help="add a batch of daily readings as a new fragment")
+    append.add_argument("batch", type=Path, help=".csv or .parquet file with the raw co_wind columns")
+    append.add_argument("--path", type=Path, help="dataset to append to (default: the dashboard's)")
+    append.add_argument("--allow-new-states", action="store_true",
+                        help="accept states the dataset and state map don't have yet")
+
+    args = parser.parse_args()
+    if args.command == "snapshot":
+        started = time.perf_counter()
+        build_snapshot(args.out, compact=args.compact)
+        print(f"Snapshot written to {args.out} in {time.perf_counter() - started:.1f}s")
+    elif args.command == "payloads":
+        started = time.perf_counter()
+        dataset = registry.get()
+        try:
+            timings = build_state_payloads(dataset, args.out, processes=args.processes)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(timings.to_string(index=False))
+        print(f"{len(timings)} states written to {args.out / dataset.version} "
+              f"in {time.perf_counter() - started:.1f}s")
+    elif args.command == "memory-report":
+        print(memory_report())
+    elif args.command == "append":
+        reader = pd.read_csv if args.batch.suffix.lower() == ".csv" else pd.read_parquet
+        try:
+            written = append_readings(reader(args.batch), args.path, allow_new_states=args.allow_new_states)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Appended {args.batch} as {', '.join(str(path) for path in written)}")
@@ -1,2 +1,24 @@
+import gc
+import os
+
 bind = "0.0.0.0:8080"
-workers = 2
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# Threads per worker. Concurrent identical requests in one worker share a
+# single computation (see single_flight.py), so a burst costs the unique work.
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Load the dataset once in the master process and fork the workers from it,
+# so they share its pages copy-on-write instead of each building a copy.
+# Set CO_DASHBOARD_PRELOAD=0 to load per worker again.
+preload_app = os.environ.get("CO_DASHBOARD_PRELOAD", "1") == "1"
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported. Finish loading
+    # the dataset here so every worker is forked with it in place. Freezing moves
+    # everything allocated so far out of the garbage collector's reach;
+    # otherwise the first collection in each worker writes to every object
+    # header and un-shares the pages.
+    if preload_app:
+        import data_prep
+        data_prep.registry.get()
+    gc.freeze()
@@ -0,0 +1,267 @@
+"""
+In-process performance instrumentation, exposed as Prometheus text.
+
+- Request latency per route, method and status.
+- Per-request stage timings: load (getting the dataset), compute,
+  serialize (JSON encoding) and compress (response cache bodies). Compute
+  is whatever is left of the request once the other stages are taken out.
+- Optional per-function timings for chosen data_prep functions, a sampled
+  fraction of which run under cProfile (see instrument()).
+
+Metrics live in the worker process; with several gunicorn workers each
+scrape of /metrics reports the worker that served it. Flask is imported
+only where a request is involved, so data_prep's offline commands can use
+stage() and the counters without it.
+"""
+import cProfile
+import io
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(names, values, extra=""):
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {bucket_count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, key)} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "dashboard_request_duration_seconds", "Request latency by route.", ("route", "method", "status"))
+STAGE_LATENCY = Histogram(
+    "dashboard_stage_duration_seconds", "Time per request stage by route.", ("route", "stage"))
+FUNCTION_LATENCY = Histogram(
+    "dashboard_function_duration_seconds", "Duration of instrumented data_prep functions.", ("function",))
+PROFILE_SAMPLES = Counter(
+    "dashboard_profile_samples_total", "Calls of instrumented functions run under cProfile.", ("function",))
+EVENTS = Counter(
+    "dashboard_events_total", "Notable events inside data preparation.", ("event",))
+
+ALL_METRICS = [REQUEST_LATENCY, STAGE_LATENCY, FUNCTION_LATENCY, PROFILE_SAMPLES, EVENTS]
+
+
+def render():
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Request stages ----------
+
+@contextmanager
+def stage(name):
+    """Time a block as a stage of the current request; nested blocks of the same stage count once."""
+    flask = sys.modules.get("flask")  # not imported yet means no request to time
+    if flask is None or not flask.has_request_context():
+        yield
+        return
+    g = flask.g
+    active = g.setdefault("_active_stages", set())
+    if name in active:
+        yield
+        return
+    active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.discard(name)
+        timings = g.setdefault("_stage_timings", defaultdict(float))
+        timings[name] += time.perf_counter() - started
+
+
+def timed_stage(name):
+    """Decorator form of stage()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def iter_timed(iterable, stage_name):
+    """
+    Wrap a streamed response body so the time spent producing it is
+    recorded as a stage once the stream is exhausted or closed.
+    """
+    route = _route()  # the body is consumed after the request context is gone
+
+    def timed():
+        elapsed = 0.0
+        iterator = iter(iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield chunk
+        finally:
+            STAGE_LATENCY.observe(elapsed, route=route, stage=stage_name)
+
+    return timed()
+
+
+def timed_json_provider(app):
+    """Flask JSON provider for `app` that records encoding time as the serialize stage."""
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def response(self, *args, **kwargs):
+            with stage("serialize"):
+                return super().response(*args, **kwargs)
+
+    return TimedJSONProvider(app)
+
+
+def _route():
+    from flask import request
+
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def init_app(app):
+    """Record request and stage latencies and serve /metrics and /metrics/profiles."""
+    from flask import Response, g, jsonify, request
+
+    @app.before_request
+    def start_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        started = g.pop("_request_started", None)
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        route = _route()
+
+        timings = g.pop("_stage_timings", {})
+        for name, seconds in timings.items():
+            STAGE_LATENCY.observe(seconds, route=route, stage=name)
+        STAGE_LATENCY.observe(max(total - sum(timings.values()), 0.0), route=route, stage="compute")
+        REQUEST_LATENCY.observe(total, route=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/profiles")
+    def profiles():
+        return jsonify({name: list(samples) for name, samples in PROFILES.items()})
+
+
+# ---------- Function instrumentation ----------
+
+# Most recent cProfile reports per function (pstats text, top entries)
+PROFILES = defaultdict(lambda: deque(maxlen=5))
+_profiling = threading.local()
+
+
+def instrument(module, names, sample_rate=0.0, top=25):
+    """
+    Replace module.<name> for each name with a wrapper that records its
+    duration; a sample_rate fraction of calls also run under cProfile.
+    Callers that look the function up on the module (data_prep.fn(...))
+    go through the wrapper.
+    """
+    for name in names:
+        fn = getattr(module, name)
+        if getattr(fn, "_instrumented", False):
+            continue
+        setattr(module, name, _instrumented(fn, name, sample_rate, top))
+
+
+def _instrumented(fn, name, sample_rate, top):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = (sample_rate > 0 and random.random() < sample_rate
+                   and not getattr(_profiling, "active", False))
+        started = time.perf_counter()
+        if not profile:
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                FUNCTION_LATENCY.observe(time.perf_counter() - started, function=name)
+
+        profiler = cProfile.Profile()
+        _profiling.active = True
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            _profiling.active = False
+            FUNCTION_LATENCY.observe(time.perf_counter() - started, function=name)
+            PROFILE_SAMPLES.inc(function=name)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+            PROFILES[name].append(report.getvalue())
+
+    wrapper._instrumented = True
+    return wrapper
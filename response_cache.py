@@ -0,0 +1,207 @@
+"""
+HTTP response cache for the dashboard's GET endpoints.
+
+Every GET endpoint is a pure function of the loaded dataset and the query
+string, so a response can be reused until the dataset changes. Entries are
+keyed on (dataset version, path, query args). Each one holds the
+serialized body plus gzip (and brotli, when installed) copies compressed
+up front. Repeat requests skip computing, serializing and compressing, and
+conditional requests get a 304 from the ETag.
+
+Views marked `shared` are built on a SingleFlight pool: concurrent misses
+for the same key wait on one build. A miss that times out gets a 503 with
+Retry-After, and the build still lands in the cache.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, copy_current_request_context, jsonify, make_response, request
+
+import metrics
+import single_flight
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip bodies are kept
+    brotli = None
+
+
+# Bytes charged per entry on top of its bodies and key: the entry object and
+# its headers. Keeps bodiless (streamed) entries from being free to hold.
+ENTRY_OVERHEAD = 512
+
+
+def still_computing():
+    """503 for a request that gave up waiting on a computation that is still running."""
+    response = jsonify({"error": "Still computing, retry shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+class CachedResponse:
+    def __init__(self, etag, weak, mimetype=None, bodies=None):
+        self.etag = etag
+        self.weak = weak
+        self.mimetype = mimetype
+        self.bodies = bodies  # {encoding: bytes}, None for streamed responses
+        self.cost = 0  # bytes charged against the cache, set when stored
+
+    @property
+    def size(self):
+        return sum(len(body) for body in self.bodies.values()) if self.bodies else 0
+
+
+class ResponseCache:
+    """
+    Bounded LRU of GET responses. `version` is a callable returning the
+    fingerprint of the dataset currently served; changing it invalidates
+    every entry. Entries are evicted once their bodies, keys and a fixed
+    per-entry overhead pass max_bytes, or there are more than max_entries.
+    `flights` is the SingleFlight pool that shared views are built on.
+    """
+
+    def __init__(self, version, max_bytes=64 * 1024 * 1024, max_age=300, flights=None,
+                 max_entries=4096):
+        self.version = version
+        self.flights = flights
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        entry.cost = entry.size + len(repr(key)) + ENTRY_OVERHEAD
+        if entry.cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.cost
+            self._entries[key] = entry
+            self._bytes += entry.cost
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.cost
+
+    def _headers(self, response, entry):
+        response.set_etag(entry.etag, weak=entry.weak)
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}, must-revalidate"
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def _not_modified(self, entry):
+        if entry.weak:
+            return request.if_none_match.contains_weak(entry.etag)
+        return request.if_none_match.contains(entry.etag)
+
+    def _respond(self, entry):
+        if self._not_modified(entry):
+            return self._headers(Response(status=304), entry)
+
+        encoding = "identity"
+        if "br" in entry.bodies and request.accept_encodings["br"]:
+            encoding = "br"
+        elif request.accept_encodings["gzip"]:
+            encoding = "gzip"
+
+        response = Response(entry.bodies[encoding], mimetype=entry.mimetype)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        return self._headers(response, entry)
+
+    def _build(self, key, response):
+        body = response.get_data()
+        with metrics.stage("compress"):
+            bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=6)}
+            if brotli is not None:
+                bodies["br"] = brotli.compress(body, quality=5)
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        return CachedResponse(etag, weak=False, mimetype=response.mimetype, bodies=bodies)
+
+    def _build_shared(self, key, view, args, kwargs):
+        # Runs on the pool, in a copy of the first caller's request context.
+        # Streamed bodies are buffered so every waiting request can send them.
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return response.get_data(), response.status_code, response.mimetype
+        entry = self._build(key, response)
+        self._put(key, entry)
+        return entry
+
+    def _respond_shared(self, key, view, args, kwargs):
+        build = copy_current_request_context(self._build_shared)
+        try:
+            result = self.flights.run(key, build, key, view, args, kwargs)
+        except single_flight.TimeoutError:
+            return still_computing()
+        if isinstance(result, CachedResponse):
+            return self._respond(result)
+        body, status, mimetype = result
+        return Response(body, status=status, mimetype=mimetype)
+
+    def cached(self, view=None, *, shared=False, accept=None):
+        """
+        Decorator for GET views whose output depends only on the dataset and
+        query args. With shared=True, concurrent misses are coalesced on
+        self.flights. `accept` lists the mimetypes a view negotiates from
+        the Accept header; the best match is then part of the key and
+        responses vary on Accept.
+        """
+        if view is None:
+            return lambda view: self.cached(view, shared=shared, accept=accept)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = serve(*args, **kwargs)
+            if accept:
+                response.vary.add("Accept")
+            return response
+
+        def serve(*args, **kwargs):
+            key = (self.version(), request.path, tuple(sorted(request.args.items(multi=True))),
+                   request.accept_mimetypes.best_match(accept) if accept else None)
+            entry = self._get(key)
+
+            if entry is not None and entry.bodies is not None:
+                return self._respond(entry)
+            if entry is not None and self._not_modified(entry):
+                return self._headers(Response(status=304), entry)
+
+            if shared and self.flights is not None:
+                return self._respond_shared(key, view, args, kwargs)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            if response.is_streamed:
+                # Bodies of streamed responses are never held in memory; they
+                # only get a weak ETag derived from the key for revalidation.
+                etag = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+                entry = CachedResponse(etag, weak=True)
+                self._put(key, entry)
+                return self._headers(response, entry)
+
+            entry = self._build(key, response)
+            self._put(key, entry)
+            return self._respond(entry)
+
+        return wrapper
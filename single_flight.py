@@ -0,0 +1,65 @@
+"""
+Request coalescing for the dashboard's heavy computations.
+
+When several clients ask for the same result at once, only the first one
+computes it; the rest wait on the same future. The work runs on a bounded
+thread pool, so a burst of requests can't start more computations than
+there are pool threads. A caller that gives up after `timeout` seconds
+leaves the computation running; whatever it was going to do with the
+result (e.g. store it in the response cache) still happens, so a retry
+picks it up instead of starting over.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import metrics
+
+__all__ = ["SingleFlight", "TimeoutError"]
+
+
+class SingleFlight:
+    """
+    Thread pool that runs at most one call per key at a time. Calls made
+    while a call with the same key is running share its result (or
+    exception).
+    """
+
+    def __init__(self, max_workers=4, timeout=30.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="single-flight")
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Return the future of the running call for `key`, starting fn(*args, **kwargs) if there is none."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                metrics.EVENTS.inc(event="coalesced")
+                return future
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def run(self, key, fn, *args, **kwargs):
+        """
+        submit() and wait for the result. Raises TimeoutError after
+        self.timeout seconds; the call keeps running in the pool.
+        """
+        future = self.submit(key, fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            metrics.EVENTS.inc(event="compute_timeout")
+            raise
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
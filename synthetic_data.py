@@ -0,0 +1,85 @@
+"""
+Seeded synthetic stand-in for static/data/co_wind_v2.csv.
+
+Produces the raw columns load_filtered_data expects (state, date_local,
+avg_measurement, avg_wind_speed, avg_wind_dir) with plausible seasonal CO,
+gamma-distributed wind speeds and a prevailing wind direction per state.
+Scale it with the number of years, states and readings per state per day.
+
+    python synthetic_data.py /tmp/co_wind.parquet --years 11 --states 50 --readings 3
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_prep import state_name_to_code
+
+STATES = sorted(state_name_to_code)
+
+
+def generate_co_wind(years: int = 11, states: int = 50, readings_per_day: int = 1,
+                     start_year: int = 2014, missing_rate: float = 0.01,
+                     seed: int = 0) -> pd.DataFrame:
+    """Return a raw co_wind frame with one row per state, day and reading."""
+    if not 1 <= states <= len(STATES):
+        raise ValueError(f"states must be between 1 and {len(STATES)}")
+    rng = np.random.default_rng(seed)
+
+    dates = pd.date_range(f"{start_year}-01-01", f"{start_year + years - 1}-12-31", freq="D")
+    names = np.array(STATES[:states], dtype=object)
+    n_days, n = len(dates), len(dates) * states * readings_per_day
+
+    state_idx = np.repeat(np.arange(states), n_days * readings_per_day)
+    day_idx = np.tile(np.repeat(np.arange(n_days), readings_per_day), states)
+    day_of_year = dates.dayofyear.to_numpy()[day_idx]
+
+    # CO peaks in winter; wind is gustier in spring
+    winter = np.cos(2 * np.pi * (day_of_year - 15) / 365.25)
+    spring = np.cos(2 * np.pi * (day_of_year - 100) / 365.25)
+    state_co = rng.uniform(0.15, 0.45, states)[state_idx]
+    state_wind = rng.uniform(5, 12, states)[state_idx]
+    prevailing = rng.uniform(0, 360, states)[state_idx]
+
+    wind_speed = rng.gamma(4.0, (state_wind * (1 + 0.2 * spring)) / 4.0)
+    co = np.clip(state_co * (1 + 0.35 * winter) - 0.01 * (wind_speed - state_wind)
+                 + rng.normal(0, 0.05, n), 0.001, None)
+    wind_dir = np.mod(prevailing + np.degrees(rng.vonmises(0, 1.5, n)), 360)
+
+    df = pd.DataFrame({
+        "state": names[state_idx],
+        "date_local": dates.strftime("%Y-%m-%d").to_numpy()[day_idx],
+        "avg_measurement": co,
+        "avg_wind_speed": wind_speed,
+        "avg_wind_dir": wind_dir,
+    })
+    for col in ["avg_measurement", "avg_wind_speed", "avg_wind_dir"]:
+        df.loc[rng.random(n) < missing_rate, col] = np.nan
+    return df
+
+
+def write_synthetic_dataset(path: Path, **kwargs) -> Path:
+    """Generate a dataset and write it as .parquet or .csv (by suffix)."""
+    path = Path(path)
+    df = generate_co_wind(**kwargs)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".csv":
+        df.to_csv(path, index=False)
+    else:
+        df.to_parquet(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out", type=Path, help="output .parquet or .csv path")
+    parser.add_argument("--years", type=int, default=11)
+    parser.add_argument("--states", type=int, default=50)
+    parser.add_argument("--readings", type=int, default=1, help="readings per state per day")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_synthetic_dataset(args.out, years=args.years, states=args.states,
+                            readings_per_day=args.readings, seed=args.seed)
+    print(f"Wrote {args.out}")
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data_prep
+from synthetic_data import generate_co_wind
+
+
+@pytest.fixture(scope="session")
+def raw_rows():
+    """
+    Two years of synthetic readings for six states, plus the awkward rows
+    real data has: missing measurements, rows without a state and a state
+    with no code.
+    """
+    raw = generate_co_wind(years=2, states=6, missing_rate=0.02, seed=3)
+    extra = pd.DataFrame({
+        "state": [None, None, "Country Of Mexico", "Country Of Mexico", raw["state"].iloc[0]],
+        "date_local": ["2014-03-02", "2015-07-19", "2014-03-02", "2015-01-05", "2014-02-11"],
+        "avg_measurement": [0.4, np.nan, 0.7, 0.2, np.nan],
+        "avg_wind_speed": [3.0, 5.5, np.nan, 4.0, 6.0],
+        "avg_wind_dir": [90.0, 180.0, 270.0, np.nan, 45.0],
+    })
+    return pd.concat([raw, extra], ignore_index=True)
+
+
+@pytest.fixture(scope="session")
+def rows(raw_rows):
+    """The raw rows feature-engineered as load_filtered_data does."""
+    return data_prep.prepare_rows(raw_rows.copy())
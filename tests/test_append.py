@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+import data_prep
+from synthetic_data import generate_co_wind, write_synthetic_dataset
+
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    return write_synthetic_dataset(tmp_path / "co_wind.parquet", years=1, states=3, seed=2)
+
+
+def batch_for(state):
+    batch = generate_co_wind(years=1, states=1, seed=4).head(5)
+    batch["date_local"] = pd.Timestamp("2015-06-01")
+    batch["state"] = state
+    return batch
+
+
+def test_unknown_states_are_refused(dataset_path):
+    with pytest.raises(ValueError, match="unknown states 'Californa'"):
+        data_prep.append_readings(batch_for("Californa"), dataset_path)
+    assert dataset_path.is_file() or len(data_prep.file_listing(dataset_path)) == 1
+
+
+def test_known_states_are_appended(dataset_path):
+    existing = pd.read_parquet(dataset_path)["state"].iloc[0]
+    for state in (existing, "Ohio"):  # in the dataset; in the state map
+        assert data_prep.append_readings(batch_for(state), dataset_path)
+
+
+def test_new_states_need_the_flag(dataset_path):
+    written = data_prep.append_readings(batch_for("Puerto Rico"), dataset_path, allow_new_states=True)
+    assert written
+    assert "Puerto Rico" in set(pd.read_parquet(dataset_path)["state"])
@@ -0,0 +1,90 @@
+import math
+
+from data_prep import assign_season, build_aggregate_cube, get_animated_co_data
+
+
+def rowwise_animated_co_data(df):
+    """get_animated_co_data as it was before the aggregate cube (frozen copy)."""
+    output = {}
+
+    for _, row in df.iterrows():
+        code = row["state_code"]
+        name = row["state"]
+        fips = row["state_fips"]
+        date = row["date_local"]
+        year = date.year
+        month = date.month
+        season = assign_season(month)
+
+        if code not in output:
+            output[code] = {
+                "state_code": code,
+                "state": name,
+                "state_fips": fips,
+                "year": {},
+                "month": {},
+                "season": {}
+            }
+
+        # Build time keys
+        year_key = str(year)
+        month_key = f"{year}-{month:02d}"
+        season_key = f"{year}-{season}"
+
+        # Append values
+        output[code]["year"].setdefault(year_key, []).append(row["avg_measurement"])
+        output[code]["month"].setdefault(month_key, []).append(row["avg_measurement"])
+        output[code]["season"].setdefault(season_key, []).append(row["avg_measurement"])
+
+    # Collapse lists to averages
+    for state in output:
+        for period_type in ["year", "month", "season"]:
+            for key, values in output[state][period_type].items():
+                if values:
+                    output[state][period_type][key] = round(sum(values) / len(values), 3)
+                else:
+                    output[state][period_type][key] = None
+
+    return output
+
+
+def assert_same_periods(actual, expected):
+    assert actual.keys() == expected.keys()
+    for code in expected:
+        for field in ["state_code", "state", "state_fips"]:
+            assert actual[code][field] == expected[code][field]
+        for period_type in ["year", "month", "season"]:
+            got, want = actual[code][period_type], expected[code][period_type]
+            assert got.keys() == want.keys(), (code, period_type)
+            for key in want:
+                # Sums taken in a different order may round the other way at .0005
+                assert math.isclose(got[key], want[key], abs_tol=1e-3 + 1e-12), (code, period_type, key)
+
+
+def test_animated_co_data_matches_rowwise(rows):
+    # The row-wise version averaged a missing reading into NaN and put rows
+    # without a state code under a NaN key. The cube skips both, so the
+    # reference is the row-wise result over the rows it handled correctly.
+    handled = rows.dropna(subset=["avg_measurement", "state_code"])
+    expected = rowwise_animated_co_data(handled)
+
+    assert_same_periods(get_animated_co_data(build_aggregate_cube(rows)), expected)
+
+
+def test_animated_co_data_skips_missing_readings_and_states(rows):
+    assert rows["avg_measurement"].isna().any()
+    assert rows["state_code"].isna().any()
+
+    output = get_animated_co_data(build_aggregate_cube(rows))
+    assert all(isinstance(code, str) for code in output)
+    values = [value for state in output.values() for period_type in ["year", "month", "season"]
+              for value in state[period_type].values()]
+    assert not any(value is None or math.isnan(value) for value in values)
+
+    clean = get_animated_co_data(build_aggregate_cube(rows.dropna(subset=["avg_measurement", "state_code"])))
+    assert output == clean
+
+
+def test_animated_co_data_accepts_rows(rows):
+    assert get_animated_co_data(rows) == get_animated_co_data(build_aggregate_cube(rows))
+
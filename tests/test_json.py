@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import data_prep
+
+FLOATS = [1.03e-13, 4e-17, 263.07281022608043, 0.1, -2.5e22, 1 / 3, np.nan, np.inf]
+
+
+def frame():
+    return pd.DataFrame({
+        "p_value": FLOATS,
+        "small": np.array(FLOATS, dtype=np.float32),
+        "n": np.arange(len(FLOATS)),
+        "flag": [True, False] * (len(FLOATS) // 2),
+        "state": ["Ohio", 'Say "hi"', None, "Ünïcode", "Ohio", "a/b", "%s", "x"],
+        "date_local": pd.to_datetime(["2014-01-04"] * len(FLOATS)),
+    })
+
+
+def expected_values(series):
+    # What json.dumps writes for each value after clean_for_json
+    values = []
+    for value in series.tolist():
+        if value is None or isinstance(value, float) and not np.isfinite(value):
+            value = None
+        values.append(value)
+    return values
+
+
+def test_floats_round_trip():
+    df = frame()
+    records = json.loads(data_prep.frame_to_json(df))
+    assert [record["p_value"] for record in records] == expected_values(df["p_value"])
+    assert [record["n"] for record in records] == df["n"].tolist()
+    assert [record["flag"] for record in records] == df["flag"].tolist()
+    assert [record["state"] for record in records] == expected_values(df["state"])
+    assert records[0]["date_local"] == "2014-01-04T00:00:00"
+
+
+def test_floats_written_like_json_dumps():
+    text = data_prep.json_column(pd.Series(FLOATS))
+    assert text == json.dumps(expected_values(pd.Series(FLOATS)), separators=(",", ":"))
+    assert "1.03e-13" in text and "263.07281022608043" in text
+
+
+def test_float32_keeps_its_own_precision():
+    values = json.loads(data_prep.json_column(frame()["small"]))
+    assert values[:3] == [float(str(np.float32(value))) for value in FLOATS[:3]]
+    assert values[-2:] == [None, None]
+
+
+def test_columnar_matches_records():
+    df = frame()
+    columns = json.loads(data_prep.frame_to_json(df, columnar=True))
+    records = json.loads(data_prep.frame_to_json(df))
+    assert columns == {col: [record[col] for record in records] for col in df.columns}
+
+
+def test_exports_round_trip():
+    df = frame()
+    positions = np.arange(len(df))
+    records = json.loads("".join(data_prep.iter_json_records(df, positions, fields=list(df.columns),
+                                                             chunk_rows=3)))
+    lines = "".join(data_prep.iter_json_records(df, positions, fields=list(df.columns), lines=True,
+                                                chunk_rows=3)).splitlines()
+    assert [json.loads(line) for line in lines] == records
+    assert [record["p_value"] for record in records] == expected_values(df["p_value"])
+    assert records[0]["date_local"] == "2014-01-04T00:00:00.000"
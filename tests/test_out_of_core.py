@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+import data_prep
+from synthetic_data import write_synthetic_dataset
+
+# Smallest batches iter_batches makes; the dataset below is several of them
+TINY_BUDGET = 1
+
+
+def declare_aggregates(registry):
+    # The row-built values the dashboard declares (see w209.py)
+    return {
+        "wind_rose_counts": registry.aggregate(
+            "wind_rose_counts", lambda ds: data_prep.get_wind_rose_counts(ds.df), data_prep.merge_counts),
+        "animated_co_counts": registry.aggregate(
+            "animated_co_counts", lambda ds: data_prep.get_animated_wind_rose_counts(ds.df, "co"),
+            data_prep.merge_counts),
+        "distribution_counts": registry.aggregate(
+            "distribution_counts", lambda ds: data_prep.distribution_counts(ds.df), data_prep.merge_counts),
+    }
+
+
+@pytest.fixture(scope="module")
+def loaded(tmp_path_factory):
+    path = write_synthetic_dataset(tmp_path_factory.mktemp("data") / "co_wind.parquet",
+                                   years=2, states=8, seed=5)
+    results = {}
+    for out_of_core in (False, True):
+        registry = data_prep.DatasetRegistry(path, snapshot_dir=None, out_of_core=out_of_core,
+                                             memory_budget=TINY_BUDGET)
+        getters = declare_aggregates(registry)
+        dataset = registry.get()
+        results[out_of_core] = dataset, {name: get(dataset) for name, get in getters.items()}
+    return path, results
+
+
+def test_streams_several_batches(loaded):
+    path, results = loaded
+    batches = list(data_prep.iter_batches(path, memory_budget=TINY_BUDGET))
+    assert len(batches) > 1
+    assert sum(map(len, batches)) == len(results[False][0].df)
+
+    dataset, _ = results[True]
+    assert dataset.out_of_core and dataset.df.empty
+
+
+def test_cube_matches(loaded):
+    _, results = loaded
+    cubes = []
+    for dataset, _ in results.values():
+        cube = dataset.cube.sort_values(data_prep.CUBE_KEYS, ignore_index=True)
+        cubes.append(cube[sorted(cube.columns)])
+    pd.testing.assert_frame_equal(*cubes, check_dtype=False, rtol=1e-9)
+
+
+def test_aggregates_match(loaded):
+    _, results = loaded
+    (_, in_memory), (_, out_of_core) = results[False], results[True]
+    for name in in_memory:
+        pd.testing.assert_series_equal(in_memory[name].sort_index(), out_of_core[name].sort_index(),
+                                       check_dtype=False, obj=name)
+
+
+def test_routes_outputs_match(loaded):
+    _, results = loaded
+    (memory, memory_values), (streamed, streamed_values) = results[False], results[True]
+
+    for group_by in (["state"], ["region"]):
+        pd.testing.assert_frame_equal(data_prep.cube_correlation(memory.cube, group_by),
+                                      data_prep.cube_correlation(streamed.cube, group_by),
+                                      check_dtype=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(data_prep.compute_raw_state_correlations(memory.cube),
+                                  data_prep.compute_raw_state_correlations(streamed.cube),
+                                  check_dtype=False, rtol=1e-9)
+
+    for state in [None, *data_prep.get_unique_states(memory.cube)[:3]]:
+        assert (data_prep.format_wind_rose(memory_values["wind_rose_counts"], state)
+                == data_prep.format_wind_rose(streamed_values["wind_rose_counts"], state))
+    assert (data_prep.format_animated_wind_rose(memory_values["animated_co_counts"], "co")
+            == data_prep.format_animated_wind_rose(streamed_values["animated_co_counts"], "co"))
+
+    for measure in data_prep.DISTRIBUTION_MEASURES:
+        for group_by in ([], ["state", "season"]):
+            assert (data_prep.distribution_summary(memory_values["distribution_counts"], measure,
+                                                   group_by=group_by)
+                    == data_prep.distribution_summary(streamed_values["distribution_counts"], measure,
+                                                      group_by=group_by))
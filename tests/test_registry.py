@@ -0,0 +1,75 @@
+import os
+import threading
+
+import pandas as pd
+
+import data_prep
+from synthetic_data import write_synthetic_dataset
+
+
+def counting_fingerprints(monkeypatch):
+    calls = []
+    digests = data_prep.file_digests
+
+    def counted(path, names=None):
+        calls.append(path)
+        return digests(path, names)
+
+    monkeypatch.setattr(data_prep, "file_digests", counted)
+    return calls
+
+
+def test_changed_file_is_hashed_once(tmp_path, monkeypatch):
+    path = write_synthetic_dataset(tmp_path / "co_wind.parquet", years=1, states=3, seed=2)
+    registry = data_prep.DatasetRegistry(path, hot_reload=True, check_interval=0, snapshot_dir=None)
+    first = registry.get()
+
+    # Touched but not modified: every thread sees the new mtime at once
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    calls = counting_fingerprints(monkeypatch)
+    start = threading.Barrier(8)
+
+    def get():
+        start.wait()
+        for _ in range(20):
+            assert registry.get() is first
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+
+
+def test_queued_reload_does_not_rehash(tmp_path, monkeypatch):
+    path = write_synthetic_dataset(tmp_path / "co_wind.parquet", years=1, states=3, seed=2)
+    registry = data_prep.DatasetRegistry(path, snapshot_dir=None)
+    first = registry.get()
+
+    calls = counting_fingerprints(monkeypatch)
+    assert registry.reload() is first
+    assert calls == []
+    assert registry.reload(force=True) is not first
+
+
+def test_appended_version_matches_a_fresh_load(tmp_path):
+    path = write_synthetic_dataset(tmp_path / "co_wind.parquet", years=2, states=3, seed=2)
+    raw = pd.read_parquet(path)
+    polled_each = data_prep.DatasetRegistry(path, snapshot_dir=None)
+    polled_once = data_prep.DatasetRegistry(path, snapshot_dir=None)
+    polled_each.get()
+    polled_once.get()
+
+    for year in ("2014", "2015"):
+        batch = raw[raw["date_local"].astype(str).str.startswith(year)].head(20)
+        data_prep.append_readings(batch, path)
+        extended = polled_each.reload()
+    assert extended.files and all(entry[2] for entry in extended.files.values())
+
+    fresh = data_prep.DatasetRegistry(path, snapshot_dir=None).get()
+    assert extended.version == polled_once.reload().version == fresh.version
+    assert fresh.version == data_prep.file_fingerprint(path)
+    assert len(extended.df) == len(fresh.df)
@@ -0,0 +1,48 @@
+from flask import Flask, Response
+
+from response_cache import ENTRY_OVERHEAD, ResponseCache
+
+
+def make_app(cache):
+    app = Flask(__name__)
+
+    @app.route("/rows")
+    @cache.cached
+    def rows():
+        return Response(iter(["[", "]"]), mimetype="application/json")
+
+    @app.route("/table")
+    @cache.cached
+    def table():
+        return {"values": list(range(100))}
+
+    return app
+
+
+def test_streamed_entries_are_bounded():
+    cache = ResponseCache(lambda: "v1", max_entries=50)
+    client = make_app(cache).test_client()
+    for cursor in range(300):
+        assert client.get(f"/rows?limit=1&cursor={cursor}").status_code == 200
+
+    assert len(cache._entries) == 50
+    assert cache._bytes >= 50 * ENTRY_OVERHEAD
+    assert cache._bytes == sum(entry.cost for entry in cache._entries.values())
+
+
+def test_bytes_bound_counts_overhead():
+    cache = ResponseCache(lambda: "v1", max_bytes=20 * ENTRY_OVERHEAD)
+    client = make_app(cache).test_client()
+    for cursor in range(300):
+        client.get(f"/rows?cursor={cursor}")
+
+    assert 0 < len(cache._entries) < 20
+    assert cache._bytes <= cache.max_bytes
+
+
+def test_cached_bodies_are_still_served():
+    cache = ResponseCache(lambda: "v1", max_entries=2)
+    client = make_app(cache).test_client()
+    first = client.get("/table")
+    again = client.get("/table", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
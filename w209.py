@@ -1,19 +1,123 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session
+import math
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, send_file, session
 from flask_cors import CORS
 import data_prep
+import metrics
+from response_cache import ResponseCache, still_computing
+from single_flight import SingleFlight, TimeoutError
 
 app = Flask(__name__)
 CORS(app)
 app.secret_key = "mids_209"
 
-# Load pre-filtered 2014–2024 data once
-full_df = data_prep.load_filtered_data()
+# Request/stage latency histograms, served at /metrics
+app.json = metrics.timed_json_provider(app)
+metrics.init_app(app)
+
+# CO_DASHBOARD_PROFILE=get_wind_rose_data,calculate_correlation times the
+# named data_prep functions; CO_DASHBOARD_PROFILE_RATE of their calls are
+# also run under cProfile (reports at /metrics/profiles).
+PROFILED_FUNCTIONS = [name for name in os.environ.get("CO_DASHBOARD_PROFILE", "").split(",") if name]
+metrics.instrument(data_prep, PROFILED_FUNCTIONS,
+                   sample_rate=float(os.environ.get("CO_DASHBOARD_PROFILE_RATE", "0")))
+
+# Pre-filtered 2014–2024 data, loaded once per version by the registry.
+# Loading runs in the background so /healthz answers right away; /readyz
+# reports when the data is in.
+registry = data_prep.registry
+
+def current_dataset():
+    # Timed as the "load" stage: a hot reload or a wait on the background load shows up here
+    with metrics.stage("load"):
+        return registry.get()
+
+# Heavy computations run on a small per-worker pool; identical requests in
+# flight share one computation, and a request that waits longer than
+# CO_DASHBOARD_COMPUTE_TIMEOUT seconds gets a 503 while the work finishes.
+flights = SingleFlight(
+    max_workers=int(os.environ.get("CO_DASHBOARD_COMPUTE_WORKERS", "2")),
+    timeout=float(os.environ.get("CO_DASHBOARD_COMPUTE_TIMEOUT", "30")),
+)
+
+# Serialized GET responses, valid for as long as the dataset is unchanged
+response_cache = ResponseCache(lambda: current_dataset().version, flights=flights)
+
+def get_us_monthly(dataset):
+    # Monthly averages for the entire dataset, with rolling averages
+    return dataset.get_derived(
+        "us_monthly", lambda ds: data_prep.get_cube_monthly_averages(ds.cube)
+    )
+
+def get_us_trend(dataset):
+    return dataset.get_derived("us_trend", lambda ds: data_prep.trend_lines(get_us_monthly(ds)))
+
+def get_all_state_monthly(dataset):
+    return dataset.get_derived(
+        "all_state_monthly", lambda ds: data_prep.get_all_state_monthly_averages(ds.cube)
+    )
+
+def get_state_monthly(dataset):
+    # {state: monthly frame with rolling averages}, as get_cube_monthly_averages returns
+    return dataset.get_derived("state_monthly", lambda ds: data_prep.split_by_state(get_all_state_monthly(ds)))
+
+def get_state_trends(dataset):
+    return dataset.get_derived(
+        "state_trends", lambda ds: data_prep.get_state_trends(get_all_state_monthly(ds))
+    )
+
+# CO_DASHBOARD_STATE_PAYLOADS=1 builds the per-state POST payloads when a
+# version loads without them. That runs on the load thread of a threaded
+# worker, where forking a pool could deadlock on locks held by other
+# threads, so they are written serially; `python data_prep.py payloads`
+# builds them ahead of time on a process pool instead
+BUILD_STATE_PAYLOADS = os.environ.get("CO_DASHBOARD_STATE_PAYLOADS", "0") == "1"
+
+# Values built from the rows are declared as registry aggregates: appended
+# rows are merged in rather than recounted, and out-of-core loads build them
+# batch by batch
+
+# Default-spec wind rose counts per state
+get_wind_rose_counts = registry.aggregate(
+    "wind_rose_counts", lambda ds: data_prep.get_wind_rose_counts(ds.df), data_prep.merge_counts
+)
+
+ANIMATED_WIND_ROSE_COUNTS = {
+    data_type: registry.aggregate(
+        ("animated_wind_rose_counts", data_type),
+        lambda ds, data_type=data_type: data_prep.get_animated_wind_rose_counts(ds.df, data_type),
+        data_prep.merge_counts,
+    )
+    for data_type in ("wind", "co")
+}
+
+def get_animated_wind_rose_counts(dataset, data_type):
+    return ANIMATED_WIND_ROSE_COUNTS[data_type](dataset)
+
+# Per state × month quantile sketches and histograms
+get_distribution_counts = registry.aggregate(
+    "distribution_counts", lambda ds: data_prep.distribution_counts(ds.df), data_prep.merge_counts
+)
 
-# Pre-compute monthly averages for the entire dataset
-# and add rolling averages
-us_monthly = data_prep.get_monthly_averages(full_df)
-us_co_trend = data_prep.calculate_trend_line(us_monthly, "date", "rolling_avg_co")
-us_wind_trend = data_prep.calculate_trend_line(us_monthly, "date", "rolling_avg_wind")
+@registry.on_load
+def precompute(dataset):
+    # Per-state series, trend lines and wind rose counts are built before the
+    # version is served
+    get_state_monthly(dataset)
+    get_state_trends(dataset)
+    get_us_trend(dataset)
+    get_wind_rose_counts(dataset)
+    get_distribution_counts(dataset)
+    for data_type in ("wind", "co"):
+        get_animated_wind_rose_counts(dataset, data_type)
+    if BUILD_STATE_PAYLOADS and not dataset.out_of_core and not data_prep.has_state_payloads(dataset.version):
+        data_prep.build_state_payloads(dataset, processes=1)
+
+registry.load_in_background()
 
 @app.route("/", methods=["GET", "POST"])
 def w209():
@@ -24,55 +128,356 @@ def w209():
 def healthz():
     return {"ok": True}, 200
 
+@app.route("/readyz")
+def readyz():
+    status = {
+        "ready": registry.ready,
+        "loading": registry.loading,
+        "version": registry.get().version if registry.ready else None,
+        "error": registry.error,
+    }
+    return status, 200 if registry.ready else 503
+
 @app.route("/states")
+@response_cache.cached
 def get_states():
-    states = data_prep.get_unique_states(full_df)
+    states = data_prep.get_unique_states(current_dataset().cube)
     return jsonify(states)
 
+def wants_columnar():
+    """`format=columnar` in the query string or JSON body."""
+    body = request.get_json(silent=True) if request.is_json else None
+    return (request.args.get("format") or (body or {}).get("format")) == "columnar"
+
+def json_response(payload):
+    """
+    JSON response written by data_prep.dumps_json. With format=columnar,
+    DataFrames in the payload are sent as one array per field.
+    """
+    body = data_prep.dumps_json(payload, columnar=wants_columnar())
+    return Response(body, mimetype="application/json")
+
+# Binary bodies for programmatic consumers of the row and comparison routes
+BINARY_FORMATS = {"arrow": data_prep.ARROW_MIMETYPE, "parquet": data_prep.PARQUET_MIMETYPE}
+NEGOTIATED_MIMETYPES = ["application/json", *BINARY_FORMATS.values()]
+
+def wanted_binary(params):
+    """
+    "arrow" or "parquet" when asked for with format=, or without format=
+    by the Accept header; None for JSON.
+    """
+    fmt = params.get("format")
+    if fmt is None:
+        best = request.accept_mimetypes.best_match(NEGOTIATED_MIMETYPES)
+        fmt = next((name for name, mimetype in BINARY_FORMATS.items() if mimetype == best), None)
+    return fmt if fmt in BINARY_FORMATS else None
+
+def arrow_unavailable():
+    # Arrow and Parquet bodies are written by pyarrow
+    return jsonify({"error": "Arrow and Parquet responses require pyarrow"}), 406
+
+def get_export_dictionaries(dataset):
+    # Fixed dictionaries for the state/region columns of binary bodies
+    return dataset.get_derived("export_dictionaries", lambda ds: data_prep.export_dictionaries(ds.cube))
+
+def stored_payload(route, state):
+    """The prebuilt body of `route` for `state` in the current version, or None."""
+    path = data_prep.state_payload_path(current_dataset().version, route, state)
+    if path is None or not path.is_file():
+        return None
+    return send_file(path, mimetype="application/json", etag=True, conditional=True)
+
+DEFAULT_ROLLING = {"window": data_prep.ROLLING_WINDOW, "center": True, "min_periods": None,
+                   "std": False, "ewm": False}
+
+def parse_flag(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("1", "true", "yes"):
+        return True
+    if str(value).lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"Expected true or false, got {value!r}")
+
+def parse_rolling_options(params):
+    """
+    Read the smoothing options of /us_combo_data and /state_comparison:
+    window (months, 1-120), center, min_periods (1-window), and the std
+    and ewm flags for extra columns. Raises ValueError on bad input.
+    """
+    options = dict(DEFAULT_ROLLING)
+    if params.get("window") is not None:
+        options["window"] = int(params["window"])
+    if not 1 <= options["window"] <= 120:
+        raise ValueError("window must be between 1 and 120")
+    if params.get("min_periods") is not None:
+        options["min_periods"] = int(params["min_periods"])
+        if not 1 <= options["min_periods"] <= options["window"]:
+            raise ValueError("min_periods must be between 1 and window")
+    for flag in ("center", "std", "ewm"):
+        if params.get(flag) is not None:
+            options[flag] = parse_flag(params[flag])
+    return options
+
+def parse_export_options(params, columns):
+    """
+    Read the row export options shared by /us_data and /state_data:
+    fields (list or comma-separated), start/end dates, max_points, limit,
+    cursor and format=ndjson|columnar|arrow|parquet. Raises ValueError on
+    bad input.
+    """
+    fields = params.get("fields")
+    if fields:
+        if isinstance(fields, str):
+            fields = [field.strip() for field in fields.split(",")]
+        unknown = [field for field in fields if field not in columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(map(str, unknown))}")
+
+    start = pd.Timestamp(params["start"]) if params.get("start") else None
+    end = pd.Timestamp(params["end"]) if params.get("end") else None
+
+    limit = int(params["limit"]) if params.get("limit") is not None else None
+    cursor = int(params.get("cursor", 0))
+    if (limit is not None and limit < 1) or cursor < 0:
+        raise ValueError("limit must be positive and cursor non-negative")
+
+    max_points = int(params["max_points"]) if params.get("max_points") is not None else None
+    if max_points is not None and max_points < 1:
+        raise ValueError("max_points must be positive")
+
+    fmt = params.get("format")
+    if fmt not in (None, "ndjson", "columnar", *BINARY_FORMATS):
+        raise ValueError("format must be ndjson, columnar, arrow or parquet")
+
+    return {
+        "fields": fields or None,
+        "start": start,
+        "end": end,
+        "max_points": max_points,
+        "limit": limit,
+        "cursor": cursor,
+        "lines": fmt == "ndjson",
+        "columnar": fmt == "columnar",
+    }
+
+def downsample(dataset, positions, state, max_points):
+    """
+    Thin the selected rows to about max_points per state, keeping each
+    series' minima and maxima. Served from a cached level of the row
+    pyramid picked for the size of the date window, so zooming in only
+    ever builds each level once per dataset version.
+    """
+    states = None if state is None else [state]
+    n_series = 1 if state is not None else max(len(dataset.index.bounds), 1)
+    if len(positions) <= max_points * n_series:
+        return positions
+
+    total = sum(rows.stop - rows.start for rows in dataset.index.slices(states))
+    buckets = data_prep.pyramid_buckets(max_points, len(positions), total)
+    if buckets > data_prep.MAX_PYRAMID_BUCKETS:
+        per_bucket = 2 * len(data_prep.DOWNSAMPLE_COLUMNS)
+        return data_prep.downsample_rows(dataset.df, positions, max(max_points // per_bucket, 1))
+    level = dataset.get_derived(("row_pyramid", buckets), lambda ds: data_prep.pyramid_level(ds.df, buckets))
+    return data_prep.within(level, positions)
+
+def stream_records(params, state=None):
+    """
+    Stream the matching daily rows as a JSON array (or NDJSON, arrays per
+    field, an Arrow IPC stream or Parquet). When a limit cuts the result
+    short, X-Next-Cursor holds the cursor of the next page.
+    """
+    dataset = current_dataset()
+    df = dataset.df
+    try:
+        options = parse_export_options(params, data_prep.export_columns(df))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    binary = wanted_binary(params)
+    if binary and data_prep.pa is None:
+        return arrow_unavailable()
+
+    if dataset.out_of_core:
+        return stream_from_disk(dataset, options, state, binary)
+
+    positions = data_prep.select_rows(df, state=state, start=options["start"], end=options["end"],
+                                      index=dataset.index)
+    if options["max_points"]:
+        positions = downsample(dataset, positions, state, options["max_points"])
+
+    cursor, limit = options["cursor"], options["limit"]
+    stop = cursor + limit if limit else len(positions)
+    headers = {}
+    if stop < len(positions):
+        headers["X-Next-Cursor"] = str(stop)
+
+    mimetype = "application/x-ndjson" if options["lines"] else "application/json"
+    if binary:
+        body = data_prep.iter_arrow_records(
+            df, positions[cursor:stop], fields=options["fields"],
+            dictionaries=get_export_dictionaries(dataset), parquet=binary == "parquet",
+        )
+        mimetype = BINARY_FORMATS[binary]
+    elif options["columnar"]:
+        body = data_prep.iter_json_columns(df, positions[cursor:stop], fields=options["fields"])
+    else:
+        body = data_prep.iter_json_records(
+            df, positions[cursor:stop], fields=options["fields"], lines=options["lines"]
+        )
+    return Response(metrics.iter_timed(body, "serialize"), mimetype=mimetype, headers=headers)
+
+def stream_from_disk(dataset, options, state, binary=None):
+    # Out-of-core mode: the rows are re-read from the data file in batches.
+    # Each batch is sorted by state and date, but batches follow file order,
+    # so the rows are only in the in-memory order when they fit in one
+    # batch. Paging by row position, and other options that need every
+    # selected row at hand, are refused.
+    if options["max_points"] or options["limit"] or options["cursor"] or options["columnar"]:
+        return jsonify({"error": "max_points, limit, cursor and format=columnar "
+                                 "are not available in out-of-core mode"}), 400
+
+    batches = map(data_prep.sort_rows, data_prep.iter_batches(
+        dataset.path, compact=registry.compact, states=None if state is None else [state],
+        start=options["start"], end=options["end"], memory_budget=registry.memory_budget,
+    ))
+    if binary:
+        body = data_prep.iter_arrow_batches(
+            batches, dataset.df, fields=options["fields"],
+            dictionaries=get_export_dictionaries(dataset), parquet=binary == "parquet",
+        )
+        mimetype = BINARY_FORMATS[binary]
+    else:
+        body = data_prep.iter_json_batches(batches, fields=options["fields"], lines=options["lines"])
+        mimetype = "application/x-ndjson" if options["lines"] else "application/json"
+    return Response(metrics.iter_timed(body, "serialize"), mimetype=mimetype)
+
 @app.route("/us_data", methods=["GET"])
+@response_cache.cached(accept=NEGOTIATED_MIMETYPES)
 def us_data():
-    return jsonify(full_df.to_dict(orient='records'))
+    return stream_records(request.args)
 
 @app.route("/state_data", methods=["POST"])
 def state_data():
-    selected_state = request.json.get('state')
-    filtered = full_df[full_df['state'] == selected_state]
-    return jsonify(filtered.to_dict(orient='records'))
+    params = {**request.args.to_dict(), **(request.json or {})}
+    selected_state = params.get('state')
+    if not selected_state:
+        return jsonify([])
+    if params.keys() == {"state"} and wanted_binary(params) is None:
+        stored = stored_payload("state_data", selected_state)
+        if stored is not None:
+            return stored
+    return stream_records(params, state=selected_state)
+
+def parse_list(params, name):
+    """A repeatable, comma-separatable query parameter as a list, or None when absent."""
+    values = [value.strip() for raw in params.getlist(name) for value in raw.split(",") if value.strip()]
+    return values or None
+
+def parse_query_options(params):
+    """
+    Read /query's filters: state and season (repeatable or comma-separated),
+    start_year/end_year (inclusive) and group_by. Raises ValueError.
+    """
+    seasons = parse_list(params, "season")
+    if seasons is not None:
+        seasons = [season.title() for season in seasons]
+        unknown = [season for season in seasons if season not in data_prep.SEASONS]
+        if unknown:
+            raise ValueError(f"Unknown seasons: {', '.join(unknown)}")
+
+    years = None
+    if params.get("start_year") is not None or params.get("end_year") is not None:
+        years = (int(params.get("start_year", data_prep.YEAR_RANGE[0])),
+                 int(params.get("end_year", data_prep.YEAR_RANGE[1])))
+        if years[0] > years[1]:
+            raise ValueError("start_year must not be after end_year")
+
+    group_by = parse_list(params, "group_by") or []
+    unknown = [dim for dim in group_by if dim not in data_prep.QUERY_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by: {', '.join(unknown)}")
+
+    return {"states": parse_list(params, "state"), "years": years, "seasons": seasons,
+            "group_by": list(dict.fromkeys(group_by))}
+
+@app.route("/query")
+@response_cache.cached
+def query():
+    # Aggregates for any state/year/season slice, rolled up from the cube
+    try:
+        options = parse_query_options(request.args)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = data_prep.query_cube(current_dataset().cube, **options)
+    return json_response({"filters": options, "results": results})
+
+@app.route("/distribution")
+@response_cache.cached
+def distribution():
+    # Percentiles and histograms for a state/year/season slice, from the sketches
+    measure = request.args.get("measure", "co")
+    if measure not in data_prep.DISTRIBUTION_MEASURES:
+        return jsonify({"error": "measure must be co or wind"}), 400
+    try:
+        options = parse_query_options(request.args)
+        quantiles = [float(q) for q in parse_list(request.args, "quantiles") or [0.05, 0.25, 0.5, 0.75, 0.95]]
+        if not all(0 <= q <= 1 for q in quantiles):
+            raise ValueError("quantiles must be between 0 and 1")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = data_prep.distribution_summary(
+        get_distribution_counts(current_dataset()), measure, quantiles=quantiles, **options
+    )
+    return json_response({
+        "measure": measure,
+        "filters": options,
+        "edges": data_prep.HISTOGRAM_EDGES[measure].tolist(),
+        "results": results,
+    })
 
 @app.route("/correlation_data", methods=["GET"])
+@response_cache.cached
 def correlation_data():
-    corr_df = data_prep.calculate_correlation(full_df, ['region'])
-    return jsonify(corr_df.to_dict(orient='records'))
+    corr_df = data_prep.cube_correlation(current_dataset().cube, ['region'])
+    return json_response(corr_df)
 
 @app.route("/state_averages")
+@response_cache.cached
 def state_averages():
-    from data_prep import get_state_averages_with_trend
-    return jsonify(get_state_averages_with_trend())
+    return json_response(data_prep.get_state_averages_with_trend(current_dataset().cube))
 
 @app.route("/seasonal_averages")
+@response_cache.cached
 def seasonal_averages():
-    df = full_df
-    seasonal_df = data_prep.get_seasonal_avg_by_region(df)
+    seasonal_df = data_prep.get_seasonal_avg_by_region(current_dataset().cube)
 
     # Confirm casing is consistent
     seasonal_df['region'] = seasonal_df['region'].str.title()
     seasonal_df['season'] = seasonal_df['season'].str.title()
 
-    north = seasonal_df[seasonal_df['region'] == 'Northern'].to_dict(orient='records')
-    south = seasonal_df[seasonal_df['region'] == 'Southern'].to_dict(orient='records')
+    north = seasonal_df[seasonal_df['region'] == 'Northern']
+    south = seasonal_df[seasonal_df['region'] == 'Southern']
 
-    return jsonify({
+    return json_response({
         "north": north,
         "south": south
     })
 
 # ---------- CHART LOGIC ----------
 @app.route("/us_combo_data")
+@response_cache.cached
 def us_combo_data():
-    df_with_region = full_df.copy()
-    df_with_region['region'] = 'US'
-    
-    us_df = data_prep.get_monthly_averages(df_with_region)
+    try:
+        rolling = parse_rolling_options(request.args)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    us_df = get_us_monthly(current_dataset()).copy()
+    if rolling != DEFAULT_ROLLING:
+        us_df = data_prep.add_rolling_averages(us_df, **rolling)
 
     # Add a dummy group for compatibility with the existing function
     us_df['region'] = 'US'
@@ -80,49 +485,82 @@ def us_combo_data():
     correlation_df = data_prep.calculate_correlation(us_df, group_by_cols=['region'])
     correlation = correlation_df['Correlation'].iloc[0] if not correlation_df.empty else None
 
-   # print(data_prep.clean_for_json(us_df))
-    return jsonify({
-        "us_monthly": data_prep.clean_for_json(us_df),
-        "us_trend": {
-            "co": data_prep.clean_for_json(data_prep.calculate_trend_line(us_df, "date", "rolling_avg_co")),
-            "wind": data_prep.clean_for_json(data_prep.calculate_trend_line(us_df, "date", "rolling_avg_wind"))
-        },
+    return json_response({
+        "us_monthly": us_df,
+        "us_trend": data_prep.trend_lines(us_df),
         "correlation": correlation
     })
 
 
 @app.route("/state_comparison", methods=["POST"])
 def state_comparison():
-    state = request.json.get("state")
-
-    state_monthly = data_prep.get_monthly_averages(full_df, state=state)
-
-    co_state_trend = data_prep.calculate_trend_line(state_monthly, "date", "rolling_avg_co")
-    wind_state_trend = data_prep.calculate_trend_line(state_monthly, "date", "rolling_avg_wind")
-
-    return jsonify({
+    params = {**request.args.to_dict(), **(request.json or {})}
+    state = params.get("state")
+    try:
+        rolling = parse_rolling_options(params)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    binary = wanted_binary(params)
+    if binary and data_prep.pa is None:
+        return arrow_unavailable()
+    if binary and not state:
+        return jsonify({"error": "state is required for arrow and parquet"}), 400
+
+    if rolling == DEFAULT_ROLLING and not wants_columnar() and binary is None:
+        stored = stored_payload("state_comparison", state)
+        if stored is not None:
+            return stored
+
+    dataset = current_dataset()
+    state_monthly = get_state_monthly(dataset).get(state)
+    us_monthly = get_us_monthly(dataset)
+
+    if rolling == DEFAULT_ROLLING and state_monthly is not None:
+        state_trend = get_state_trends(dataset)[state]
+        us_trend = get_us_trend(dataset)
+    else:
+        # Other smoothing re-rolls the cached monthly series (O(n) per series);
+        # a state not in the data is computed on the spot as before
+        if state_monthly is None:
+            state_monthly = data_prep.get_cube_monthly_averages(dataset.cube, state=state)
+        if rolling != DEFAULT_ROLLING:
+            state_monthly = data_prep.add_rolling_averages(state_monthly.copy(), **rolling)
+            us_monthly = data_prep.add_rolling_averages(us_monthly.copy(), **rolling)
+        state_trend = data_prep.trend_lines(state_monthly)
+        us_trend = data_prep.trend_lines(us_monthly)
+
+    if binary:
+        # Both monthly series in one table, told apart by a `series` column
+        # (the state or "US"); the trend lines go in the schema metadata
+        monthly = pd.concat([state_monthly.assign(series=state), us_monthly.assign(series="US")],
+                            ignore_index=True)
+        body = data_prep.frame_to_arrow(
+            monthly, {"series": list(dict.fromkeys([state, "US"]))}, parquet=binary == "parquet",
+            metadata={"state": state, "state_trend": state_trend, "us_trend": us_trend},
+        )
+        return Response(body, mimetype=BINARY_FORMATS[binary])
+
+    return json_response({
         "state": state,
-        "state_monthly": data_prep.clean_for_json(state_monthly),
-        "state_trend": {
-            "co": co_state_trend,
-            "wind": wind_state_trend
-        },
-        "us_monthly": data_prep.clean_for_json(us_monthly),
-        "us_trend": {
-            "co": us_co_trend,
-            "wind": us_wind_trend
-        }
+        "state_monthly": state_monthly,
+        "state_trend": state_trend,
+        "us_monthly": us_monthly,
+        "us_trend": us_trend
     })
 
+@app.route("/state_trends")
+@response_cache.cached(shared=True)
+def state_trends():
+    # Every state's CO and wind trend lines, as in /state_comparison's state_trend
+    return json_response(get_state_trends(current_dataset()))
+
 @app.route("/treemap_data")
+@response_cache.cached
 def treemap_data():
-    df = data_prep.load_filtered_data()
-
     # Group by state and region to get avg CO
     co_by_state = (
-        df.groupby(["state", "region"])["avg_measurement"]
-        .mean()
-        .reset_index()
+        data_prep.rollup_cube(current_dataset().cube, ["state", "region"])
         .sort_values("avg_measurement", ascending=False)
     )
 
@@ -137,69 +575,176 @@ def treemap_data():
 
     return jsonify(nodes)
 
+def parse_wind_rose_spec(params):
+    """
+    Read the optional `bins` (direction sectors) and `edges` (category
+    boundaries, list or comma-separated) options. Raises ValueError.
+    """
+    n_bins = int(params.get("bins", data_prep.DEFAULT_DIRECTION_BINS))
+    if not 1 <= n_bins <= 360:
+        raise ValueError("bins must be between 1 and 360")
+
+    edges = params.get("edges")
+    if edges is not None:
+        if isinstance(edges, str):
+            edges = edges.split(",")
+        if any(isinstance(edge, bool) for edge in edges):
+            raise ValueError("edges must be numbers")
+        edges = tuple(float(edge) for edge in edges)
+        if not 1 <= len(edges) <= 64:
+            raise ValueError("edges must have between 1 and 64 values")
+        if not all(map(math.isfinite, edges)):
+            raise ValueError("edges must be finite numbers")
+        if any(hi <= lo for lo, hi in zip(edges, edges[1:])):
+            raise ValueError("edges must be increasing")
+
+    return n_bins, edges
+
+# Other bin specs, per (state, bin spec) and (data_type, bin spec); the wind
+# rose charts only ever ask for a handful of combinations. Keyed on the
+# dataset version too, so a computation still running on the old version
+# when a reload clears the caches can't leave its result for the new one.
+# Out of core, the counts are folded over the data file a batch at a time.
+@lru_cache(maxsize=256)
+def cached_wind_rose(version, state, n_bins, edges):
+    dataset = current_dataset()
+    if dataset.out_of_core:
+        counts = data_prep.fold_batches(
+            data_prep.iter_batches(dataset.path, compact=registry.compact, states=[state] if state else None,
+                                   memory_budget=registry.memory_budget),
+            lambda rows: data_prep.get_wind_rose_counts(rows, n_bins=n_bins, speed_edges=edges),
+            data_prep.merge_counts,
+        )
+        return data_prep.format_wind_rose(counts, state, speed_edges=edges)
+    rows = dataset.rows([state]) if state else dataset.df
+    return data_prep.get_wind_rose_data(rows, state, n_bins=n_bins, speed_edges=edges)
+
+@lru_cache(maxsize=32)
+def cached_animated_wind_rose(version, data_type, n_bins, edges):
+    dataset = current_dataset()
+    if dataset.out_of_core:
+        counts = data_prep.fold_batches(
+            data_prep.iter_batches(dataset.path, compact=registry.compact, memory_budget=registry.memory_budget),
+            lambda rows: data_prep.get_animated_wind_rose_counts(rows, data_type, n_bins=n_bins, edges=edges),
+            data_prep.merge_counts,
+        )
+        return data_prep.format_animated_wind_rose(counts, data_type, edges=edges)
+    return data_prep.get_animated_wind_rose_data(dataset.df, data_type, n_bins=n_bins, edges=edges)
+
+@registry.on_reload
+def clear_caches(dataset):
+    response_cache.clear()
+    cached_wind_rose.cache_clear()
+    cached_animated_wind_rose.cache_clear()
+
 @app.route("/wind_rose", methods=["POST"])
 def wind_rose():
-    selected_state = request.json.get('state')
-
-    df = full_df
-    wind_data = data_prep.get_wind_rose_data(df, selected_state)
+    body = request.json or {}
+    selected_state = body.get('state')
+
+    try:
+        n_bins, edges = parse_wind_rose_spec(body)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if n_bins == data_prep.DEFAULT_DIRECTION_BINS and edges is None:
+        stored = stored_payload("wind_rose", selected_state)
+        if stored is not None:
+            return stored
+        wind_data = data_prep.format_wind_rose(get_wind_rose_counts(current_dataset()), selected_state)
+    else:
+        version = current_dataset().version
+        try:
+            wind_data = flights.run(("wind_rose", version, selected_state, n_bins, edges),
+                                    cached_wind_rose, version, selected_state, n_bins, edges)
+        except TimeoutError:
+            return still_computing()
 
     return jsonify(wind_data)
 
 @app.route("/wind_rose/animated")
+@response_cache.cached(shared=True)
 def animated_wind_rose():
     data_type = request.args.get("type", "wind")  # defaults to 'wind' if not provided
 
-    df = full_df
     if data_type not in ["wind", "co"]:
         return jsonify({"error": "Invalid data type"}), 400
 
-    data = data_prep.get_animated_wind_rose_data(df, data_type)
+    try:
+        n_bins, edges = parse_wind_rose_spec(request.args)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if n_bins == data_prep.DEFAULT_DIRECTION_BINS and edges is None:
+        counts = get_animated_wind_rose_counts(current_dataset(), data_type)
+        data = data_prep.format_animated_wind_rose(counts, data_type)
+    else:
+        data = cached_animated_wind_rose(current_dataset().version, data_type, n_bins, edges)
     return jsonify(data)
 
 @app.route("/choropleth_data")
+@response_cache.cached
 def choropleth_data():
-    df = full_df
-    
+    keys = ['state_code', 'state_fips', 'state']
     state_avg = (
-    df.groupby(['state_code','state_fips', 'state'])['avg_measurement']
-    .mean()
-    .reset_index()
-    .rename(columns={'avg_measurement': 'avg_co'})
-)
-    return jsonify(state_avg.to_dict(orient='records'))
+        data_prep.rollup_cube(current_dataset().cube, keys)[keys + ['avg_measurement']]
+        .rename(columns={'avg_measurement': 'avg_co'})
+    )
+    return json_response(state_avg)
 
 @app.route("/choropleth_data/animated")
+@response_cache.cached(shared=True)
 def animated_choropleth_data():
-    df = full_df
-    
-    data = data_prep.get_animated_co_data(df)
-    return jsonify(data)
+    data = data_prep.get_animated_co_data(current_dataset().cube)
+    return json_response(data)
 
 @app.route("/co_wind_correlation")
+@response_cache.cached(shared=True)
 def co_wind_correlation():
-    df = full_df  # ensure this is raw daily data
-    corr_df = data_prep.compute_raw_state_correlations(df)
-    return jsonify(corr_df.to_dict(orient="records"))
+    # Daily-level statistics, summed in the cube's pair_* columns
+    corr_df = data_prep.compute_raw_state_correlations(current_dataset().cube)
+    return json_response(corr_df)
+
+def parse_granularity(params, default, allowed):
+    """Read the granularity= option of the /wind_vectors routes. Raises ValueError."""
+    granularity = params.get("granularity", default)
+    if granularity not in allowed:
+        raise ValueError(f"granularity must be one of {', '.join(allowed)}")
+    return granularity
 
 @app.route("/wind_vectors/static")
+@response_cache.cached
 def state_wind_vectors():
-    df = full_df
-    wind_vectors = data_prep.get_wind_vectors_static(df)
+    # One row per state (and period, for granularities other than "all")
+    try:
+        granularity = parse_granularity(request.args, "all", list(data_prep.WIND_VECTOR_GRANULARITIES))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify(data_prep.clean_for_json(wind_vectors))
+    wind_vectors = data_prep.get_wind_vectors(current_dataset().cube, granularity)
+    return json_response(wind_vectors)
 
 @app.route("/wind_vectors/animated")
+@response_cache.cached(shared=True)
 def wind_vectors_animated():
-    df = full_df
-    vectors_by_year = data_prep.get_wind_vectors_by_year(df)
-    return jsonify(data_prep.clean_for_json(vectors_by_year))
+    try:
+        granularity = parse_granularity(request.args, "year", ["year", "season", "month", "year_season"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    vectors_by_period = data_prep.get_wind_vectors_by_period(current_dataset().cube, granularity)
+    return json_response(vectors_by_period)
 
 @app.route("/wind_vectors/seasonal")
+@response_cache.cached(shared=True)
 def wind_vectors_seasonal():
-    df = full_df
-    grouped_data = data_prep.get_wind_vectors_by_season(df)
-    return jsonify(data_prep.clean_for_json(grouped_data))
+    try:
+        granularity = parse_granularity(request.args, "year_season", ["year_season", "season"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    grouped_data = data_prep.get_wind_vectors_by_season(current_dataset().cube, granularity)
+    return json_response(grouped_data)
 
 if __name__ == "__main__":
     app.run(debug=True)